@@ -0,0 +1,266 @@
+# Co-draft and choice statistics for BayesBot, computed from an encoded drafts tensor
+
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+
+from .bayes_bot import save_bayes_matrices
+from .load import create_le, encode_drafts, open_draft_store
+
+COUNT_MATRICES = ["nChoice", "dChoice", "nCoDraft", "dCoDraft"]
+
+#Default counts file, kept apart from the matrix caches BayesBot builds from csv files.
+BAYES_COUNTS = "bayes_counts.npz"
+
+#Version of the count manifest format, see save_cooccurrence().
+COUNTS_VERSION = 1
+
+def build_cooccurrence(drafts_tensor, n_cards=None, chunk_size=500):
+    """
+    Counts the statistics of bayesbot_preprocessor.ipynb for all picks of all drafts.
+
+    For a pick with human pick vector h (one hot), pack vector p (card counts, including the
+    pick) and collection vector c (cards picked earlier in the draft), the notebook adds
+      nChoice  += outer(h, p)    dChoice  += outer(p, p)
+      nCoDraft += outer(h, c)    dCoDraft += outer(p, c)
+    and pFull counts every pick. Here the picks of a chunk of drafts are stacked into matrices
+    H, P and C (one row per pick), and the sums of outer products become matrix products:
+    nChoice = H'P, dChoice = P'P, nCoDraft = H'C and dCoDraft = P'C = (H'R)', where R holds the
+    packs seen after each pick. H is a sparse one-hot matrix, so only P'P is a dense product.
+    Chunks are small enough for float32 products to be exact.
+
+    :param drafts_tensor: Int tensor of shape (num_drafts, 3*pack_size, pack_size), as created by
+                          drafts_to_tensor. Padding after the cards of each pack is ignored.
+    :param n_cards: Number of cards in the set (default: largest card id + 1). Use len(le.classes_).
+    :param chunk_size: Number of drafts counted at once.
+
+    :return: Dict of int64 arrays: nChoice, dChoice, nCoDraft, dCoDraft of shape (n_cards, n_cards)
+             and pFull of shape (n_cards,).
+    """
+    num_drafts, draft_size, pack_size = drafts_tensor.shape
+    if n_cards is None:
+        n_cards = int(np.max(drafts_tensor)) + 1 if num_drafts > 0 else 0
+    n = n_cards
+    chunk_size = max(1, min(chunk_size, 2**24 // (draft_size * pack_size * max(draft_size, pack_size))))
+
+    counts = empty_cooccurrence(n)
+
+    #Slots holding a card: pack size shrinks by one with every pick of a round.
+    cards_in_pack = pack_size - np.arange(draft_size) % pack_size
+    slot_mask = np.arange(pack_size)[None, :] < cards_in_pack[:, None]
+    earlier = np.tril(np.ones([draft_size, draft_size], dtype=np.float32), -1) # earlier[t, s] = s < t
+
+    for start in range(0, num_drafts, chunk_size):
+        chunk = np.asarray(drafts_tensor[start:start+chunk_size], dtype=np.intp)
+        chunk_drafts = chunk.shape[0]
+        n_picks = chunk_drafts * draft_size
+        picks = chunk[:, :, 0].reshape(-1)
+
+        #One row per pick: H one hot, P pack counts (toarray sums repeated cards).
+        H = sparse.csr_matrix((np.ones(n_picks, dtype=np.float32), picks, np.arange(n_picks + 1)),
+                              shape=(n_picks, n))
+        cards = chunk[np.broadcast_to(slot_mask, chunk.shape)]
+        indptr = np.r_[0, np.cumsum(np.tile(cards_in_pack, chunk_drafts))]
+        P = sparse.csr_matrix((np.ones(len(cards), dtype=np.float32), cards, indptr),
+                              shape=(n_picks, n)).toarray()
+
+        #Collections before each pick, and packs seen after each pick, within each draft.
+        picks_dense = H.toarray().reshape(chunk_drafts, draft_size, n)
+        C = np.matmul(earlier, picks_dense).reshape(n_picks, n)
+        R = np.matmul(earlier.T, P.reshape(chunk_drafts, draft_size, n)).reshape(n_picks, n)
+
+        HT = H.T.tocsr()
+        counts["nChoice"] += np.rint(HT @ P).astype(np.int64)
+        counts["dChoice"] += np.rint(P.T @ P).astype(np.int64)
+        counts["nCoDraft"] += np.rint(HT @ C).astype(np.int64)
+        counts["dCoDraft"] += np.rint(HT @ R).astype(np.int64).T
+        counts["pFull"] += np.bincount(picks, minlength=n)
+
+    return counts
+
+def cooccurrence_to_probabilities(counts):
+    """
+    Derives BayesBot probabilities from build_cooccurrence counts, as in bayesbot_preprocessor.ipynb.
+
+    :return: Tuple (pCoDraft, pChoice, pFull) of float64 arrays.
+    """
+    nChoice = counts["nChoice"].astype(np.float64)
+    np.fill_diagonal(nChoice, 0) # Self-comparisons don't matter
+    pChoice = nChoice/np.maximum(1, counts["dChoice"])
+    pCoDraft = counts["nCoDraft"]/np.maximum(1, counts["dCoDraft"])
+    return pCoDraft, pChoice, counts["pFull"].astype(np.float64)
+
+def empty_cooccurrence(n_cards):
+    """Returns zero counts in the format of build_cooccurrence."""
+    counts = {name: np.zeros([n_cards, n_cards], dtype=np.int64) for name in COUNT_MATRICES}
+    counts["pFull"] = np.zeros(n_cards, dtype=np.int64)
+    return counts
+
+def manifest_path(path):
+    """Path of the manifest describing the counts at path: bayes_counts.npz -> bayes_counts.json."""
+    return os.path.splitext(path)[0] + ".json"
+
+def save_cooccurrence(path, counts, le, sources=None):
+    """
+    Writes the count matrices, with the probability matrices derived from them (see 
+    save_bayes_matrices), and a json manifest next to them. pFull is stored as counts, as in the
+    notebook. BayesBot reads the file when passed as its cachePath, and never overwrites it.
+
+    Counts are additive: counts of disjoint sets of drafts sum to the counts of their union. The
+    manifest records which drafts were counted, so that update_cooccurrence and merge_cooccurrence
+    never count a draft twice:
+      version  - format version
+      classes  - label encoder classes, in matrix order
+      n_drafts - number of drafts counted
+      sources  - list of {"source", "start", "stop"}: drafts start:stop of a draft file or store
+
+    :param path: Path of the .npz file, e.g. bots_data/bayes_counts.npz (BAYES_COUNTS).
+    :param counts: Dict returned by build_cooccurrence.
+    :param le: Label encoder used to create the drafts tensor.
+    :param sources: (Optional) Ranges of drafts counted, as in the manifest.
+    """
+    sources = _sorted_sources(sources or [])
+    pCoDraft, pChoice, pFull = cooccurrence_to_probabilities(counts)
+    save_bayes_matrices(path, pCoDraft, pChoice, pFull, [str(c) for c in le.classes_],
+                        **{name: counts[name] for name in COUNT_MATRICES})
+    manifest = {
+        "version": COUNTS_VERSION,
+        "classes": [str(c) for c in le.classes_],
+        "n_drafts": sum(r["stop"] - r["start"] for r in sources),
+        "sources": sources,
+    }
+    with open(manifest_path(path), "w") as f:
+        json.dump(manifest, f, indent=1)
+
+def read_cooccurrence(path):
+    """
+    Reads counts written by save_cooccurrence.
+
+    :return: Tuple of the counts dict, its label encoder and the list of counted draft ranges.
+    """
+    with open(manifest_path(path)) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != COUNTS_VERSION:
+        raise ValueError("Unsupported count manifest version: %s" % manifest.get("version"))
+    with np.load(path) as f:
+        counts = {name: f[name].astype(np.int64) for name in COUNT_MATRICES}
+        counts["pFull"] = np.rint(f["pFull"]).astype(np.int64)
+    return counts, create_le(manifest["classes"]), manifest["sources"]
+
+def _sorted_sources(sources):
+    """Sorts draft ranges, merging adjacent ranges and rejecting overlapping ones."""
+    merged = []
+    for r in sorted(sources, key=lambda r: (r["source"], r["start"])):
+        if merged and merged[-1]["source"] == r["source"] and r["start"] < merged[-1]["stop"]:
+            raise ValueError("Drafts %d:%d of %s are counted twice" 
+                             % (r["start"], min(r["stop"], merged[-1]["stop"]), r["source"]))
+        if merged and merged[-1]["source"] == r["source"] and r["start"] == merged[-1]["stop"]:
+            merged[-1]["stop"] = r["stop"]
+        elif r["stop"] > r["start"]:
+            merged.append(dict(source=r["source"], start=int(r["start"]), stop=int(r["stop"])))
+    return merged
+
+def _uncounted(sources, source, start, stop):
+    """Returns the (start, stop) ranges of drafts start:stop of source missing from sources."""
+    gaps = []
+    for r in _sorted_sources(sources):
+        if r["source"] != source or r["stop"] <= start:
+            continue
+        if r["start"] >= stop:
+            break
+        if r["start"] > start:
+            gaps.append((start, r["start"]))
+        start = max(start, r["stop"])
+    if start < stop:
+        gaps.append((start, stop))
+    return gaps
+
+def _check_classes(le, other, what):
+    if list(map(str, le.classes_)) != list(map(str, other.classes_)):
+        raise ValueError("Card names of %s do not match the counts" % what)
+
+def update_cooccurrence(path, draft_path, le=None, set_var=None, start=0, stop=None, 
+                        chunk_size=500, n_jobs=1):
+    """
+    Folds drafts start:stop of draft_path that are not counted yet into the counts at path,
+    creating them if needed. The cost is proportional to the new drafts only, except that a draft
+    csv file is parsed in full: prefer draft stores (see save_draft_store) for large sources.
+
+    Workers can count disjoint ranges of a source into separate files in parallel, which are then
+    summed with merge_cooccurrence.
+
+    :param path: Path of the counts .npz file, see save_cooccurrence.
+    :param draft_path: Draft store (path without extension) or draft csv file.
+    :param le: Label encoder. Required for a csv source when the counts do not exist yet.
+    :param set_var: (Optional) Set variable with the original cardnames of a csv source, see
+                    encode_drafts.
+    :param start: (Optional) First draft of draft_path to count.
+    :param stop: (Optional) End of the drafts to count (default: all drafts).
+    :param chunk_size: Number of drafts counted at once, see build_cooccurrence.
+    :param n_jobs: Number of processes parsing a csv source, see encode_drafts.
+
+    :return: Tuple of the updated counts dict and the number of drafts added.
+    """
+    source = os.path.realpath(draft_path)
+    is_store = os.path.exists(draft_path + ".json")
+    if os.path.exists(path):
+        counts, counts_le, sources = read_cooccurrence(path)
+        if le is not None:
+            _check_classes(counts_le, le, "le")
+        le = counts_le
+    else:
+        counts, sources = None, []
+
+    #Opens the source, encoding a csv file in full.
+    if is_store:
+        drafts_tensor, store_le = open_draft_store(draft_path)
+        if le is None:
+            le = store_le
+        _check_classes(le, store_le, draft_path)
+    else:
+        if le is None:
+            raise ValueError("A label encoder is needed to encode " + draft_path)
+        drafts_tensor = encode_drafts(draft_path, le, set_var, n_jobs=n_jobs)
+    if counts is None:
+        counts = empty_cooccurrence(len(le.classes_))
+    stop = len(drafts_tensor) if stop is None else min(stop, len(drafts_tensor))
+
+    #Counts only the missing ranges.
+    added = 0
+    for gap_start, gap_stop in _uncounted(sources, source, start, stop):
+        new_counts = build_cooccurrence(drafts_tensor[gap_start:gap_stop], len(le.classes_), chunk_size)
+        for name in counts:
+            counts[name] += new_counts[name]
+        sources.append(dict(source=source, start=gap_start, stop=gap_stop))
+        added += gap_stop - gap_start
+
+    if added > 0 or not os.path.exists(path):
+        save_cooccurrence(path, counts, le, sources)
+    return counts, added
+
+def merge_cooccurrence(path, part_paths):
+    """
+    Sums counts written by save_cooccurrence, e.g. by parallel update_cooccurrence workers.
+    Raises ValueError if the parts use different card names or count the same drafts.
+
+    :param path: Path of the merged counts .npz file. May be one of the parts.
+    :param part_paths: Paths of the counts to sum.
+
+    :return: Merged counts dict.
+    """
+    counts, le, sources = None, None, []
+    for part_path in part_paths:
+        part_counts, part_le, part_sources = read_cooccurrence(part_path)
+        if counts is None:
+            counts, le = part_counts, part_le
+        else:
+            _check_classes(le, part_le, part_path)
+            for name in counts:
+                counts[name] += part_counts[name]
+        sources = _sorted_sources(sources + part_sources)
+    if counts is None:
+        raise ValueError("No counts to merge")
+    save_cooccurrence(path, counts, le, sources)
+    return counts
@@ -1,29 +1,98 @@
 # Wrapper class for any neural-network bot
 
 from .bot import *
-from .load import collection_pack_to_x
+import json
+import os
 import pandas as pd
 import numpy as np
 
+def save_bayes_matrices(path, pColl, pPack, pFull, names, **counts):
+    """
+    Saves Bayes probability matrices and their card names to one .npz file.
+    
+    :param path: Path of the .npz file.
+    :param pColl: Co-draft probability matrix, shape (n, n).
+    :param pPack: Choice probability matrix, shape (n, n).
+    :param pFull: Full probability vector or matrix.
+    :param names: Card names, in matrix row order.
+    :param counts: Optional extra arrays stored under their keyword, e.g. the count
+                   matrices the probabilities were derived from.
+    """
+    np.savez(path, pColl=np.asarray(pColl, dtype=np.float64), pPack=np.asarray(pPack, dtype=np.float64),
+             pFull=np.asarray(pFull, dtype=np.float64), names=np.asarray(names, dtype=str), **counts)
+
+def load_bayes_matrices(path):
+    """
+    Loads matrices saved by save_bayes_matrices.
+    
+    :return: Tuple (pColl, pPack, pFull, names).
+    """
+    with np.load(path) as f:
+        return f["pColl"], f["pPack"], f["pFull"], f["names"]
+
+def get_csv_fingerprint(paths):
+    """
+    Identifies the csv files a matrix cache is built from, by real path, size and modification time.
+
+    :return: Json string, equal for two calls only if the same files are unchanged.
+    """
+    fingerprint = []
+    for path in paths:
+        if path is None or not os.path.exists(path):
+            fingerprint.append(None)
+        else:
+            stat = os.stat(path)
+            fingerprint.append([os.path.realpath(path), stat.st_size, stat.st_mtime_ns])
+    return json.dumps(fingerprint)
+
+def has_counts(path):
+    """Returns True if a matrices file also holds the counts written by draftsimtools.bayes.save_cooccurrence."""
+    with np.load(path) as f:
+        return "nChoice" in f.files
+
+def read_csv_fingerprint(path):
+    """Returns the csv fingerprint stored in a matrix cache, or None."""
+    with np.load(path) as f:
+        return str(f["sources"]) if "sources" in f.files else None
+
 class BayesBot(Bot):
     
-    def __init__(self, le, pCollPath, pPackPath, pFullPath, namesPath):
+    def __init__(self, le, pCollPath, pPackPath, pFullPath, namesPath, cachePath=None):
+        """
+        Matrices are read from cachePath (default: pCollPath with extension .npz). The cache
+        records the real path, size and modification time of the csv files it was built from,
+        and is (re)built when it is missing or any of them differ. A counts file written by
+        draftsimtools.bayes.save_cooccurrence (e.g. bots_data/bayes_counts.npz) can be passed as
+        cachePath: its matrices are used as they are, and it is never overwritten.
+        """
         self.num_correct = 0
         self.num_total = 0
         self.le = le   # Pre-trained label-encoder mapping card names to numeric class labels
 
-        # Reads in probability matrices and card names
-        self.pColl = np.loadtxt(pCollPath, delimiter=",")
-        self.pPack = np.loadtxt(pPackPath, delimiter=",")
-        self.pF = np.loadtxt(pFullPath, delimiter=",")
-        self.names = pd.read_csv(namesPath)
-
-        print(self.names)
+        # Reads in probability matrices and card names, parsing the csv files only if needed
+        if cachePath is None:
+            cachePath = os.path.splitext(pCollPath)[0] + ".npz"
+        sources = get_csv_fingerprint([pCollPath, pPackPath, pFullPath, namesPath])
+        if os.path.exists(cachePath) and has_counts(cachePath):
+            pass # Derived from counts kept up to date by draftsimtools.bayes
+        elif not os.path.exists(cachePath) or read_csv_fingerprint(cachePath) != sources:
+            save_bayes_matrices(cachePath,
+                                np.loadtxt(pCollPath, delimiter=","),
+                                np.loadtxt(pPackPath, delimiter=","),
+                                np.loadtxt(pFullPath, delimiter=","),
+                                pd.read_csv(namesPath).iloc[:, 0].astype(str),
+                                sources=np.array(sources))
+        self.pColl, self.pPack, self.pF, names = load_bayes_matrices(cachePath)
+        self.names = pd.DataFrame({"Name": names})
 
         # Sets constants
         minPEver = np.min(self.pColl[self.pColl>0])/2 # Even smaller than the smallest non-zero P observed
         self.pC = np.log(np.maximum(self.pColl,minPEver))-np.log(minPEver) # C from 'Collection'
         self.pP = np.log(np.maximum(self.pPack,minPEver))-np.log(minPEver) # P from 'Pack'
+
+        # Cached label-encoder lookups, instead of le.transform / le.inverse_transform per card
+        self.classes = [str(c) for c in self.le.classes_]
+        self.card_index = {c: i for i, c in enumerate(self.classes)}
         
     def rank_pack(self, draft_frame):
         """
@@ -60,20 +129,53 @@ class BayesBot(Bot):
         pack = draft_frame[0]
         collection = draft_frame[1]
 
-        # Maps card names to one-hot encoding
-        x = collection_pack_to_x(collection, pack, self.le)
-        x = np.transpose(x.numpy())
-        collectionVector = x[:int(len(x) / 2)]
-        packVector = x[int(len(x) / 2):]
+        # Maps card names to class labels, each pack card is rated once
+        pack_cards = np.unique([self.card_index[card] for card in pack])
 
-        # Gets ratings from bot
+        # Gets ratings from bot, only for the pack rows
         if collection == []: # First card
-            ratings = np.matmul(self.pP, packVector) # Only ratings
+            pack_counts = np.bincount([self.card_index[card] for card in pack], minlength=len(self.classes))
+            ratings = self.pP[pack_cards] @ pack_counts # Only ratings
+        elif self.is_tracking(collection):
+            ratings = self.draft_collection_ratings[pack_cards] # Only synergies, kept by observe_pick
         else:
-            ratings = np.matmul(self.pC, collectionVector) # Only synergies
-        ratings = ratings*(packVector > 0)
+            collection_cards = [self.card_index[card] for card in collection]
+            ratings = self.pC[np.ix_(pack_cards, collection_cards)].sum(axis=1) # Only synergies
         
         # Maps ratings to card names
-        pack_rank = {str(self.le.inverse_transform([i])[0]) : v for i, v in enumerate(ratings[:,0]) if v > 0}
+        pack_rank = {self.classes[i] : v for i, v in zip(pack_cards, ratings) if v > 0}
         
-        return pack_rank
\ No newline at end of file
+        return pack_rank
+
+    def rank_packs(self, packs, collections):
+        """
+        Batched ranking, see Bot.rank_packs. Card ids are labels of self.le. Cards that
+        __get_ranking leaves out (ratings not above 0) score -inf.
+        """
+        packs = np.asarray(packs, dtype=np.intp)
+        collections = np.asarray(collections, dtype=np.intp)
+        pack_mask = packs >= 0
+        collection_mask = collections >= 0
+        pack_cards = np.where(pack_mask, packs, 0)
+        collection_cards = np.where(collection_mask, collections, 0)
+        first = ~collection_mask.any(axis=1) # First card
+
+        # Only synergies: pC summed over the collection, for every pack card
+        ratings = (self.pC[pack_cards[:, :, None], collection_cards[:, None, :]] * 
+                   collection_mask[:, None, :]).sum(axis=2)
+
+        # Only ratings: pP summed over the pack, counting repeated cards
+        first_cards = pack_cards[first]
+        ratings[first] = (self.pP[first_cards[:, :, None], first_cards[:, None, :]] * 
+                          pack_mask[first][:, None, :]).sum(axis=2)
+
+        ratings[~pack_mask | ~(ratings > 0)] = -np.inf
+        return ratings
+
+    def begin_draft(self):
+        super(BayesBot, self).begin_draft()
+        self.draft_collection_ratings = np.zeros(len(self.classes)) # Running pC column sums of the collection
+
+    def observe_pick(self, card):
+        super(BayesBot, self).observe_pick(card)
+        self.draft_collection_ratings += self.pC[:, self.card_index[card]]
@@ -1,5 +1,25 @@
 import random
 
+import numpy as np
+
+
+def pad_card_ids(card_id_lists, width=None):
+    """
+    Stacks lists of card ids into an int array of shape (len(card_id_lists), width), padded
+    with -1 after the ids of each list, as taken by Bot.rank_packs. width defaults to the
+    longest list.
+    """
+    if width is None:
+        width = max([len(ids) for ids in card_id_lists] + [0])
+    padded = np.full([len(card_id_lists), width], -1, dtype=np.intp)
+    for i, ids in enumerate(card_id_lists):
+        padded[i, :len(ids)] = ids
+    return padded
+
+def has_batched_ranking(bot):
+    """Returns True if bot overrides Bot.rank_packs with its own batched kernel."""
+    return type(bot).rank_packs is not Bot.rank_packs
+
 
 class Bot(object):
 
@@ -33,6 +53,35 @@ class Bot(object):
         return pack_rank
 
 
+    def rank_packs(self, packs, collections):
+        """
+        INPUT: packs - int array of shape (n_frames, max_pack) of card ids, i.e. labels of self.le,
+                       padded with -1 after the cards of each pack. The human pick is the first card.
+                       Bots without self.le take an array of card names instead, padded with None.
+               collections - array of shape (n_frames, max_collection) of card ids (or names), padded
+                             with -1 (or None)
+        OUTPUT: float array of shape (n_frames, max_pack) with the score of each pack card, as in
+                rank_pack, and -inf for padding and for cards that rank_pack leaves out
+        
+        Batched form of rank_pack. This default calls rank_pack once per frame; bots override it
+        with kernels that score all frames at once. Neither updates num_total, num_correct or 
+        running draft state.
+        """
+        packs = np.asarray(packs)
+        collections = np.asarray(collections).reshape(len(packs), -1)
+        if packs.dtype.kind in "iu":
+            classes = np.array([str(c) for c in self.le.classes_] + [None], dtype=object)
+            packs, collections = classes[packs], classes[collections] # Padding -1 maps to None
+        scores = np.full(packs.shape, -np.inf)
+        counters = self.num_total, self.num_correct
+        for i in range(len(packs)):
+            pack = [card for card in packs[i] if card is not None]
+            collection = [card for card in collections[i] if card is not None]
+            pack_rank = self.rank_pack([pack, collection])
+            scores[i, :len(pack)] = [pack_rank.get(card, -np.inf) for card in pack]
+        self.num_total, self.num_correct = counters
+        return scores
+
     def __get_ranking(self, draft_frame):
         """
         INPUT: one draft frame in form [pack, collection], where the human pick is the first 
@@ -50,6 +99,34 @@ class Bot(object):
         
         return pack_rank
 
+    def begin_draft(self):
+        """
+        Called by the testing script before the first pick of each draft.
+
+        Together with observe_pick, this lets bots keep running draft state (collection,
+        color commitment etc.) and update it in O(1) per pick, instead of recomputing it
+        from the full collection on every frame. Stateful bots override both methods,
+        call the base versions, and use their running state only if is_tracking(collection)
+        is true. Bots that don't override them use the stateless path.
+        """
+        self.draft_collection = []
+
+    def observe_pick(self, card):
+        """
+        Called by the testing script with the card added to the collection after each pick.
+        """
+        if getattr(self, "draft_collection", None) is not None:
+            self.draft_collection.append(card)
+
+    def is_tracking(self, collection):
+        """
+        Returns True if the picks observed since begin_draft are exactly collection, so that
+        running draft state can be used instead of recomputing it from collection. The O(n)
+        comparison is cheap next to scoring a pack.
+        """
+        tracked = getattr(self, "draft_collection", None)
+        return tracked is not None and len(tracked) == len(collection) and tracked == list(collection)
+
     def get_performance(self):
         """Return tuple of number of correct picks so far."""
         return self.num_total, self.num_correct
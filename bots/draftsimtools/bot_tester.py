@@ -1,9 +1,280 @@
 import numpy as np
 import datetime
+import hashlib
+import json
+import os
 import pandas as pd
+import time
 from operator import itemgetter
 from copy import deepcopy
 
+from .bot import has_batched_ranking
+from .load import map_jobs
+
+#Version of the evaluation manifest format, see BotTester.evaluate_bots().
+EVALUATION_VERSION = 1
+
+def encode_drafts_ids(drafts, classes):
+    """Maps a list of drafts to an int array (n_drafts, max_picks, max_pack) of indices into 
+    classes, padded with -1, as taken by Bot.rank_packs. The array is int16, or int32 for sets
+    of 2**15 cards or more."""
+    card_index = {str(card): i for i, card in enumerate(classes)}
+    max_picks = max([len(draft) for draft in drafts] + [0])
+    max_pack = max([len(pack) for draft in drafts for pack in draft] + [0])
+    dtype = np.int16 if len(card_index) < 2**15 else np.int32
+    draft_ids = np.full([len(drafts), max_picks, max_pack], -1, dtype=dtype)
+    for draft_num, draft in enumerate(drafts):
+        for pick_num, pack in enumerate(draft):
+            draft_ids[draft_num, pick_num, :len(pack)] = [card_index[card] for card in pack]
+    return draft_ids
+
+def _get_metrics(packs, scores):
+    """Returns top-one and top-three accuracy and rank error (int8 arrays) for scored packs."""
+    rank_error, n_ranked = BotTester.get_human_ranks(packs, scores)
+    return [(rank_error < np.minimum(n_ranked, 1)).astype(np.int8), 
+            (rank_error < np.minimum(n_ranked, 3)).astype(np.int8), 
+            rank_error.astype(np.int8)]
+
+def _get_timed_picks(n_picks, n_samples):
+    """Returns a bool mask of the picks, in draft order, whose latency is measured: n_samples 
+    picks (or all) spread evenly over the drafts."""
+    timed = np.zeros(n_picks, dtype=bool)
+    timed[::max(1, -(-n_picks // max(n_samples, 1)))] = True
+    return timed
+
+def _time_frame(bot, pack, collection):
+    """Returns the time of a rank_packs call on a single frame, in nanoseconds."""
+    start_ns = time.perf_counter_ns()
+    bot.rank_packs(pack[None], collection[None])
+    return time.perf_counter_ns() - start_ns
+
+def _evaluate_batched(bot, draft_ids, draft_lengths, metrics, batch_size, latency_samples):
+    """Evaluates a bot with a batched Bot.rank_packs kernel on encoded drafts, in autoregressive mode.
+
+    Groups of batch_size drafts advance in lockstep: each pick number is scored for every draft
+    of the group with a single rank_packs call, and each bot's top pick (first highest score 
+    in pack order) joins its collection. Returns (correct, fuzzy_correct, rank_error) int8 
+    arrays, per-pick latency and encode, score and metric times as _evaluate_shard, and 
+    updates the bot's num_total and num_correct. Latency is measured on latency_samples picks with an extra rank_packs 
+    call on the pick's frame alone, as a drafting server would score it; these calls are not
+    part of the stage times.
+    """
+    n_drafts, max_picks = draft_ids.shape[:2]
+    bot_picks = np.full([n_drafts, max_picks], -1, dtype=draft_ids.dtype)
+    results = [np.zeros([n_drafts, max_picks], dtype=np.int8) for metric in metrics]
+    valid = np.arange(max_picks)[None, :] < draft_lengths[:, None]
+    timed = np.zeros([n_drafts, max_picks], dtype=bool)
+    timed[valid] = _get_timed_picks(int(valid.sum()), latency_samples)
+    latency_ns = np.full([n_drafts, max_picks], -1, dtype=np.int64)
+    stage_ns = np.zeros(3, dtype=np.int64)
+    for first in range(0, n_drafts, batch_size):
+        group_lengths = draft_lengths[first:first+batch_size]
+        for pick_num in range(group_lengths.max()):
+            start_ns = time.perf_counter_ns()
+            active = first + np.flatnonzero(group_lengths > pick_num)
+            packs = draft_ids[active, pick_num]
+            collections = bot_picks[active, :pick_num]
+            encoded_ns = time.perf_counter_ns()
+
+            # Gets bot ranking on the current packs of the group's drafts
+            scores = bot.rank_packs(packs, collections)
+            scored_ns = time.perf_counter_ns()
+            bot_picks[active, pick_num] = packs[np.arange(len(active)), np.argmax(scores, axis=1)]
+
+            # Gets top-one and top-three accuracy and rank error for the current packs
+            for result, values in zip(results, _get_metrics(packs, scores)):
+                result[active, pick_num] = values
+            stage_ns += [encoded_ns - start_ns, scored_ns - encoded_ns, time.perf_counter_ns() - scored_ns]
+
+            # Gets the latency of timed picks, one frame at a time
+            for i in np.flatnonzero(timed[active, pick_num]):
+                latency_ns[active[i], pick_num] = _time_frame(bot, packs[i], collections[i])
+
+    # Keeps picks in draft order
+    bot.num_total += int(valid.sum())
+    bot.num_correct += int(((bot_picks == draft_ids[:, :, 0]) & valid).sum())
+    return [result[valid] for result in results] + [latency_ns[valid], stage_ns]
+
+def _evaluate_batched_human(bot, draft_ids, draft_lengths, metrics, batch_size, latency_samples):
+    """Evaluates a bot with a batched Bot.rank_packs kernel on encoded drafts, in human mode.
+
+    The collection of every pick is the human's earlier picks, so picks don't depend on each
+    other: picks of all drafts are flattened in draft order and scored batch_size at a time.
+    Returns (correct, fuzzy_correct, rank_error) int8 arrays, per-pick latency and encode,
+    score and metric times as _evaluate_batched, and updates the bot's num_total and num_correct.
+    """
+    n_drafts, max_picks = draft_ids.shape[:2]
+    draft_nums, pick_nums = np.nonzero(np.arange(max_picks)[None, :] < draft_lengths[:, None])
+    human_picks = draft_ids[:, :, 0]
+    results = [np.zeros(len(draft_nums), dtype=np.int8) for metric in metrics]
+    timed = _get_timed_picks(len(draft_nums), latency_samples)
+    latency_ns = np.full(len(draft_nums), -1, dtype=np.int64)
+    stage_ns = np.zeros(3, dtype=np.int64)
+    for start in range(0, len(draft_nums), batch_size):
+        start_ns = time.perf_counter_ns()
+        batch = slice(start, start + batch_size)
+        drafts, picks = draft_nums[batch], pick_nums[batch]
+        packs = draft_ids[drafts, picks]
+        width = picks.max()
+        collections = np.where(np.arange(width)[None, :] < picks[:, None], human_picks[drafts, :width], -1)
+        encoded_ns = time.perf_counter_ns()
+
+        # Gets bot ranking on a batch of packs, from any drafts and pick numbers
+        scores = bot.rank_packs(packs, collections)
+        scored_ns = time.perf_counter_ns()
+        top_picks = packs[np.arange(len(packs)), np.argmax(scores, axis=1)]
+        bot.num_total += len(packs)
+        bot.num_correct += int((top_picks == packs[:, 0]).sum())
+
+        # Gets top-one and top-three accuracy and rank error for the batch
+        for result, values in zip(results, _get_metrics(packs, scores)):
+            result[batch] = values
+        stage_ns += [encoded_ns - start_ns, scored_ns - encoded_ns, time.perf_counter_ns() - scored_ns]
+
+        # Gets the latency of timed picks, one frame at a time
+        for i in np.flatnonzero(timed[batch]):
+            latency_ns[start + i] = _time_frame(bot, packs[i], collections[i, :picks[i]])
+    return results + [latency_ns, stage_ns]
+
+def _evaluate_shard(job):
+    """Evaluates every bot on a list of drafts, bot after bot. 
+
+    Process pool entry point for BotTester.evaluate_bots(), also used for serial runs.
+    Bots with a batched ranking kernel (see has_batched_ranking) are evaluated with 
+    _evaluate_batched or _evaluate_batched_human, all others draft by draft with rank_pack.
+
+    :param job: Tuple (bots, drafts, mode, metrics, batch_size, latency_samples), where mode is
+                one of BotTester.MODES and the others are BotTester.METRICS, BATCH_SIZE and
+                LATENCY_SAMPLES. 
+    
+    :return: One tuple per bot: (correct, fuzzy_correct, rank_error) int8 arrays with one
+             entry per pick in draft order, (num_total, num_correct) increments of the 
+             bot's counters, the time taken, an int64 array of the latency of every pick 
+             (-1 for picks not timed) and an int64 array of the time spent encoding, scoring
+             and computing metrics (-1 if not measured), all in nanoseconds from 
+             time.perf_counter_ns.
+    """
+    bots, drafts, mode, metrics, batch_size, latency_samples = job
+    draft_lengths = np.array([len(draft) for draft in drafts], dtype=np.intp)
+    encoded = {} # Encoded drafts for each card list, shared by bots with the same label encoder
+    results = []
+    for bot in bots:
+        before = datetime.datetime.now()
+        num_total, num_correct = bot.num_total, bot.num_correct
+        if has_batched_ranking(bot):
+            start_ns = time.perf_counter_ns()
+            classes = tuple(str(card) for card in bot.le.classes_)
+            if classes not in encoded:
+                encoded[classes] = encode_drafts_ids(drafts, classes)
+            encoded_ns = time.perf_counter_ns()
+            if mode == 'human':
+                all_correct, all_fuzzy, all_rank_error, latency_ns, stage_ns = _evaluate_batched_human(
+                    bot, encoded[classes], draft_lengths, metrics, batch_size, latency_samples)
+            else:
+                all_correct, all_fuzzy, all_rank_error, latency_ns, stage_ns = _evaluate_batched(
+                    bot, encoded[classes], draft_lengths, metrics, batch_size, latency_samples)
+            stage_ns[0] += encoded_ns - start_ns
+            counters = (bot.num_total - num_total, bot.num_correct - num_correct)
+            results.append((all_correct, all_fuzzy, all_rank_error, counters, datetime.datetime.now() - before,
+                            latency_ns, stage_ns))
+            continue
+
+        n_picks = sum(len(draft) for draft in drafts)
+        all_correct = np.zeros(n_picks, dtype=np.int8)
+        all_fuzzy = np.zeros(n_picks, dtype=np.int8)
+        all_rank_error = np.zeros(n_picks, dtype=np.int8)
+        latency_ns = np.zeros(n_picks, dtype=np.int64)
+        metric_ns = 0
+        pack_counter = 0
+        for draft in drafts:
+            collection = []
+            bot.begin_draft()
+            for pack in draft:
+
+                # Gets bot ranking on the current pack, then adds the bot's or the human's pick
+                start_ns = time.perf_counter_ns()
+                pack_rank = bot.rank_pack([pack, collection])
+                collection.append(pack[0] if mode == 'human' else bot.get_top_pick(pack_rank))
+                bot.observe_pick(collection[-1])
+                scored_ns = time.perf_counter_ns()
+
+                # Gets top-one and top-three accuracy and rank error for the current pack
+                rank_error = BotTester.get_human_rank(pack, pack_rank)
+                all_correct[pack_counter] = rank_error < min(len(pack_rank), 1)
+                all_fuzzy[pack_counter] = rank_error < min(len(pack_rank), 3)
+                all_rank_error[pack_counter] = rank_error
+                latency_ns[pack_counter] = scored_ns - start_ns
+                metric_ns += time.perf_counter_ns() - scored_ns
+                pack_counter += 1
+        counters = (bot.num_total - num_total, bot.num_correct - num_correct)
+        stage_ns = np.array([-1, latency_ns.sum(), metric_ns], dtype=np.int64) # Encoding happens inside rank_pack
+        results.append((all_correct, all_fuzzy, all_rank_error, counters, datetime.datetime.now() - before,
+                        latency_ns, stage_ns))
+    return results
+
+def _save_chunk(path, result):
+    """Atomically writes an _evaluate_shard result of one bot to an .npz file."""
+    correct, fuzzy_correct, rank_error, counters, time_taken, latency_ns, stage_ns = result
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, correct=correct, fuzzy_correct=fuzzy_correct, rank_error=rank_error,
+                 counters=np.array(counters, dtype=np.int64), seconds=time_taken.total_seconds(),
+                 latency_ns=latency_ns, stage_ns=stage_ns)
+    os.replace(path + ".tmp", path)
+
+def _load_chunk(path):
+    """Reads an _evaluate_shard result of one bot written by _save_chunk."""
+    with np.load(path) as f:
+        return (f["correct"], f["fuzzy_correct"], f["rank_error"], tuple(int(c) for c in f["counters"]),
+                datetime.timedelta(seconds=float(f["seconds"])), f["latency_ns"], f["stage_ns"])
+
+def _write_manifest(output_dir, manifest):
+    """Atomically writes the manifest of an evaluation directory."""
+    path = os.path.join(output_dir, "manifest.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+def _read_manifest(output_dir):
+    """Returns the manifest of an evaluation directory, or None if there is none yet."""
+    path = os.path.join(output_dir, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != EVALUATION_VERSION:
+        raise ValueError("Unsupported evaluation manifest version: %s" % manifest.get("version"))
+    return manifest
+
+def bootstrap_ratio(sums, counts, ci = 0.95, n_boot = 1000, rng = None):
+    """Estimates sum(sums) / sum(counts) with a percentile bootstrap confidence interval.
+
+    Units (drafts) are resampled with replacement, so that picks of the same draft stay 
+    together. Paired differences between bots are estimated from the differences of their sums.
+
+    :param sums: Float array with the sum of a metric over the picks of each unit.
+    :param counts: Int array with the number of picks of each unit.
+    :param ci: (Optional) Confidence level of the interval.
+    :param n_boot: (Optional) Number of bootstrap resamples.
+    :param rng: (Optional) np.random.RandomState drawing the resamples.
+
+    :return: Tuple (estimate, low, high), NaN without picks.
+    """
+    rng = np.random if rng is None else rng
+    sums, counts = np.asarray(sums, dtype=float), np.asarray(counts, dtype=float)
+    n_units = len(sums)
+    if counts.sum() == 0:
+        return np.nan, np.nan, np.nan
+    boot = []
+    chunk = max(1, 2**22 // n_units) # Resamples per chunk, to bound memory
+    for start in range(0, n_boot, chunk):
+        units = rng.randint(n_units, size=(min(chunk, n_boot - start), n_units))
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            boot.append(sums[units].sum(axis=1) / counts[units].sum(axis=1))
+    boot = np.concatenate(boot)
+    alpha = (1 - ci) / 2
+    low, high = np.nanquantile(boot, [alpha, 1 - alpha])
+    return sums.sum() / counts.sum(), low, high
+
 class BotTester(object):
     """The BotTester object is used to evaluate how close a collection of bot's picks match human picks.
     
@@ -12,118 +283,508 @@ class BotTester(object):
         tester.evaluate_bots([bot], ["SGD"])
         tester.write_rating_dict()
     """
+
+    #Per-pick metrics stored for every bot, named as the DataFrames they are reported in.
+    METRICS = ['correct', 'fuzzy_correct', 'rank_error']
+
+    #Top-one accuracy tables, by the pick attribute they group on.
+    ACCURACY_TABLES = {'card_acc': 'human_pick', 'pick_acc': 'pick_num', 'pack_acc': 'pack_num'}
+
+    #Evaluation modes, by how the collection of each pick is built, see evaluate_bots.
+    MODES = {'autoregressive': "the bot's own top picks", 'human': "the human's earlier picks (teacher forcing)"}
+
+    #Number of picks scored per rank_packs call in human mode.
+    BATCH_SIZE = 4096
+
+    #Picks per shard whose latency is measured with a single-frame call, for batched bots.
+    LATENCY_SAMPLES = 1000
+
+    #Largest default number of drafts per shard of a checkpointed evaluation.
+    CHECKPOINT_SHARD_SIZE = 1000
+
+    #Sampled evaluations: drafts per round between early stopping checks, blocks of draft
+    #order to stratify on, and bootstrap resamples per confidence interval.
+    SAMPLE_BATCH = 200
+    SAMPLE_BLOCKS = 10
+    BOOTSTRAP_SAMPLES = 1000
+
+    #Metrics whose interval width is checked against a single target_width.
+    ACCURACY_METRICS = ['correct', 'fuzzy_correct']
    
     def __init__(self, drafts):
         """Create a new BotTester instance.
 
+        Results are stored as typed arrays with one entry per pick, in draft order. The
+        DataFrames correct, fuzzy_correct, rank_error, card_acc, pick_acc and pack_acc are
+        built from them when first requested.
+
         Fields:
           self.drafts - a collection of multiple draft objects (list of list of list of cardnames)
-          self.correct - DataFrame of all bots' correct choices compared to human picks
-          self.fuzzy_correct - DataFrame of all bots' correct choices (if human pick in top 3 bot picks)
-          self.card_acc - DataFrame of per-card accuracy metrics for all bots
+          self.n_packs - total number of picks in drafts
+          self.draft_nums, self.pick_nums - int32 arrays of 1-based draft and pick numbers
+          self.pack_nums - int8 array of 1-based pack numbers, from the size of each draft's first pack
+          self.card_names - sorted array of all cardnames picked by humans
+          self.human_pick_ids - int16 array of human picks, as indices into card_names
+          self.results - dict of bot name -> dict of metric -> int8 array, see METRICS
+          self.modes - dict of bot name -> evaluation mode of its results, see MODES
+          self.sample_results - dict of bot name -> results of a sampled evaluation, see evaluate_bots
+          self.timings - dict of bot name -> timing arrays of its last evaluation, see timing
         
         :param drafts: Attach a set of drafts to the BotTester
         """
         before = datetime.datetime.now()
         self.drafts = drafts
-        self.n_packs = len(drafts)*45
-        self.correct = pd.DataFrame(columns = ['draft_num', 'pick_num', 'human_pick'], index = range(self.n_packs))
-        self.fuzzy_correct = pd.DataFrame(columns = ['draft_num', 'pick_num', 'human_pick'], index = range(self.n_packs))
-        self.rank_error = pd.DataFrame(columns = ['draft_num', 'pick_num', 'human_pick'], index = range(self.n_packs))
-        self.card_acc = pd.DataFrame(columns = ['human_pick'])
+        draft_lengths = [len(draft) for draft in drafts]
+        self.n_packs = sum(draft_lengths)
+        self.draft_nums = np.repeat(np.arange(1, len(drafts) + 1, dtype=np.int32), draft_lengths)
+        self.pick_nums = np.concatenate([np.arange(1, n + 1, dtype=np.int32) for n in draft_lengths] + 
+                                        [np.zeros(0, dtype=np.int32)])
+        pack_sizes = np.repeat([max(len(draft[0]), 1) if len(draft) > 0 else 1 for draft in drafts], draft_lengths)
+        self.pack_nums = ((self.pick_nums - 1) // pack_sizes + 1).astype(np.int8)
+        human_picks = [pack[0] for draft in drafts for pack in draft]
+        self.card_names, human_pick_ids = np.unique(np.array(human_picks, dtype=object), return_inverse=True)
+        self.human_pick_ids = human_pick_ids.astype(np.int16)
+        self.results = {}
+        self.modes = {}
+        self.sample_results = {}
+        self.timings = {}
+        self._frames = {}
         print("Initialization time taken: " + str(datetime.datetime.now() - before))
 
-    def evaluate_bots(self, bots, bot_names):
+    @property
+    def correct(self):
+        """DataFrame of all bots' correct choices compared to human picks."""
+        return self.get_frame('correct')
+
+    @property
+    def fuzzy_correct(self):
+        """DataFrame of all bots' correct choices (if human pick in top 3 bot picks)."""
+        return self.get_frame('fuzzy_correct')
+
+    @property
+    def rank_error(self):
+        """DataFrame of all bots' rank of the human pick."""
+        return self.get_frame('rank_error')
+
+    @property
+    def card_acc(self):
+        """DataFrame of per-card accuracy metrics for all bots."""
+        return self.get_frame('card_acc')
+
+    @property
+    def pick_acc(self):
+        """DataFrame of per-pick-number accuracy for all bots."""
+        return self.get_frame('pick_acc')
+
+    @property
+    def pack_acc(self):
+        """DataFrame of per-pack accuracy for all bots."""
+        return self.get_frame('pack_acc')
+
+    @property
+    def timing(self):
+        """DataFrame of latency and throughput of all bots, see get_timing_table."""
+        return self.get_frame('timing')
+
+    def get_frame(self, name):
+        """Builds (once) and returns the DataFrame of a metric, or an accuracy table."""
+        if name not in self._frames:
+            if name in self.ACCURACY_TABLES:
+                self._frames[name] = self.get_accuracy_table(self.ACCURACY_TABLES[name])
+            elif name == 'timing':
+                self._frames[name] = self.get_timing_table()
+            else:
+                frame = pd.DataFrame({'draft_num': self.draft_nums, 'pick_num': self.pick_nums, 
+                                      'human_pick': self.card_names[self.human_pick_ids]})
+                for bot_name in self.results:
+                    frame[bot_name] = self.results[bot_name][name]
+                self._frames[name] = frame
+        return self._frames[name]
+
+    def get_accuracies(self, group_ids, n_groups, metric = 'correct'):
+        """Returns the mean of a metric per group of picks, for every bot.
+
+        All bots are aggregated in a single np.bincount pass over group ids.
+
+        :param group_ids: Int array with the group of each pick, in 0:n_groups.
+        :param n_groups: Number of groups.
+        :param metric: (Optional) One of METRICS.
+
+        :return: Float array of shape (n_groups, n_bots), bots in self.results order.
+        """
+        n_bots = len(self.results)
+        values = np.concatenate([self.results[bot_name][metric] for bot_name in self.results] + [np.zeros(0)])
+        ids = (np.arange(n_bots)[:, None]*n_groups + group_ids[None, :]).ravel()
+        sums = np.bincount(ids, weights = values, minlength = n_bots*n_groups).reshape(n_bots, n_groups)
+        counts = np.bincount(group_ids, minlength = n_groups)
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            return (sums / counts).T
+
+    def get_accuracy_table(self, by, metric = 'correct'):
+        """Returns a DataFrame of the mean of a metric for all bots, per human_pick, pick_num or pack_num."""
+        if by == 'human_pick':
+            keys, group_ids = self.card_names, self.human_pick_ids.astype(np.intp)
+        elif by == 'pick_num':
+            keys = np.arange(1, self.pick_nums.max(initial = 0) + 1)
+            group_ids = self.pick_nums.astype(np.intp) - 1
+        elif by == 'pack_num':
+            keys = np.arange(1, self.pack_nums.max(initial = 0) + 1)
+            group_ids = self.pack_nums.astype(np.intp) - 1
+        else:
+            raise ValueError("Unknown accuracy grouping: " + str(by))
+        accuracies = self.get_accuracies(group_ids, len(keys), metric)
+        table = pd.DataFrame({by: keys}) # human_pick is just where the card names came from
+        for i, bot_name in enumerate(self.results):
+            table[bot_name] = accuracies[:, i]
+        return table
+
+    def get_timing_table(self):
+        """Returns a DataFrame of latency and throughput, one row per bot in self.timings.
+
+        Latencies are per pick, in milliseconds, the time to score one frame alone: for bots 
+        with a batched ranking kernel, a rank_packs call on one frame, measured on LATENCY_SAMPLES
+        picks per shard (n_timed in all), otherwise every rank_pack call plus observe_pick. 
+        picks_per_sec counts the time spent encoding, scoring and on metrics in the evaluation
+        itself, batched where the bot allows it; encode_sec, score_sec and metric_sec split that
+        time, and encode_sec is NaN for bots that encode inside rank_pack. Timings are summed 
+        over worker processes, so they don't shrink with n_jobs.
+        """
+        columns = ['bot', 'mode', 'n_picks', 'n_timed', 'picks_per_sec', 'latency_p50_ms', 'latency_p95_ms', 
+                   'latency_p99_ms', 'latency_max_ms', 'encode_sec', 'score_sec', 'metric_sec']
+        rows = []
+        for bot_name, timings in self.timings.items():
+            latency_ns = timings['latency_ns']
+            latency_ms = latency_ns[latency_ns >= 0] / 1e6
+            stage_sec = np.where(timings['stage_ns'] >= 0, timings['stage_ns'] / 1e9, np.nan)
+            total_sec = np.nansum(stage_sec)
+            p50, p95, p99, p100 = np.percentile(latency_ms, [50, 95, 99, 100]) if len(latency_ms) else [np.nan]*4
+            rows.append([bot_name, timings['mode'], len(latency_ns), len(latency_ms), 
+                         len(latency_ns) / total_sec if total_sec else np.nan, p50, p95, p99, p100] + list(stage_sec))
+        return pd.DataFrame(rows, columns = columns)
+
+    def _store_timings(self, bot_name, mode, bot_results):
+        """Stores the per-pick latencies and stage times of a bot's _evaluate_shard results."""
+        self.timings[bot_name] = {'mode': mode, 
+                                  'latency_ns': np.concatenate([results[5] for results in bot_results] + 
+                                                               [np.zeros(0, dtype=np.int64)]),
+                                  'stage_ns': sum((results[6] for results in bot_results), np.zeros(3, dtype=np.int64))}
+
+    def evaluate_bots(self, bots, bot_names, n_jobs = 1, mode = 'autoregressive', output_dir = None, shard_size = None,
+                      sample = None, ci = 0.95, seed = None, target_width = None):
         """Evaluates accuracy and fuzzy accuracy of a list of bots. 
         
         "Correct" is whether or not the bot's top choice matched the human's top choice.
         "Fuzzy correct" is whether or not the human's top choice was in the bot's top 3 choices.
-        These values are stored the DataFrames acc and fuzz_acc for all bots.
+        These values are stored in self.results and reported in the DataFrames correct and
+        fuzzy_correct for all bots.
+
+        With n_jobs > 1, contiguous shards of drafts are evaluated in a process pool, each 
+        worker with its own pickled copy of the bots, and results are reassembled in draft 
+        order. Bots are reset by begin_draft() before every draft, so results are identical 
+        to the serial run, except for bots that draw random numbers (RandomBot, RaredraftBot): 
+        each worker continues from its own copy of the random state.
+
+        Bots that override Bot.rank_packs (ClassicBot, BayesBot, NeuralNetBot) are scored in 
+        batches of rank_packs calls: drafts advance pick number by pick number in groups of 
+        BATCH_SIZE drafts in autoregressive mode, see _evaluate_batched, and BATCH_SIZE picks
+        of any drafts are scored together in human mode. 
+        Their results equal those of rank_pack, except that ties between different cards
+        are broken in pack order rather than in the order of the bot's pack_rank dict.
 
         :param bots: List of bots that all inherit from "bot.py"
         :param bot_names: List of bot names (strings) of the same size as the list of bots.
+        :param n_jobs: (Optional) Number of worker processes.
+        :param mode: (Optional) How the collection of each pick is built, one of MODES:
+                     'autoregressive' - the bot's own top picks so far, as the bot would draft.
+                                        Every pick depends on the bot's previous picks.
+                     'human' - the human's earlier picks, as in DraftDataset training data 
+                               (teacher forcing). Picks are independent, so batched bots score
+                               BATCH_SIZE picks of any drafts per rank_packs call.
+                     The mode of each bot's results is recorded in self.modes.
+        :param output_dir: (Optional) Directory to checkpoint results to, created if needed. 
+                           The result of each bot on each shard of drafts is written to 
+                           output_dir/<bot dir>/<first draft>.npz as soon as it is done, and 
+                           recorded in output_dir/manifest.json with the drafts' fingerprint,
+                           the shard size and the mode of each bot. Running again with the 
+                           same output_dir skips shards already done, e.g. after a crash, and
+                           reads them back; new bot names are evaluated on all shards. Use
+                           load_evaluations to read bots of earlier runs without their bot 
+                           objects. One run at a time may write to an output_dir.
+        :param shard_size: (Optional) Number of drafts per shard. Defaults to 4 shards per job,
+                           and to at most CHECKPOINT_SHARD_SIZE drafts with output_dir, where
+                           it is fixed by the manifest once written.
+        :param sample: (Optional) Number (int) or fraction (float) of drafts to evaluate, for 
+                       quick comparisons. Drafts are drawn in a random order stratified by draft
+                       length and by position in the draft list (SAMPLE_BLOCKS blocks), and 
+                       evaluated SAMPLE_BATCH at a time. Results go to self.sample_results 
+                       instead of self.results, with the evaluated draft indices, and estimates
+                       are printed; see get_estimates and compare_bots.
+        :param ci: (Optional) Confidence level of the intervals of a sampled evaluation.
+        :param seed: (Optional) Random seed of the sample and of its bootstrap intervals. Bots 
+                     evaluated with the same seed and sample see the same drafts, for paired 
+                     comparisons.
+        :param target_width: (Optional) Stops a sampled evaluation early, after the first batch
+                             where the intervals of all bots are at most this wide: a float for 
+                             the ACCURACY_METRICS, or a dict of metric -> width.
         """
+        if mode not in self.MODES:
+            raise ValueError("Unknown evaluation mode: " + str(mode))
+        if sample is not None:
+            if output_dir is not None:
+                raise ValueError("Sampled evaluations are not checkpointed")
+            return self._evaluate_sample(bots, bot_names, n_jobs, mode, sample, ci, seed, target_width)
 
-        # Checks if we need to initialize dataframes
-        initialize = np.isnan(self.correct.iloc[0,2])
+        # Splits drafts into shards, as recorded in the manifest when checkpointing
+        before = datetime.datetime.now()
+        n_drafts = len(self.drafts)
+        if output_dir is not None:
+            manifest = self._open_evaluation(output_dir, shard_size, n_jobs)
+            shard_size = manifest['shard_size']
+            bot_entries = [self._get_bot_entry(manifest, bot_name, mode) for bot_name in bot_names]
+            for bot_entry in bot_entries:
+                os.makedirs(os.path.join(output_dir, bot_entry['dir']), exist_ok = True)
+            _write_manifest(output_dir, manifest)
+        elif shard_size is None:
+            shard_size = max(1, -(-n_drafts // (4*n_jobs))) if n_jobs > 1 else max(n_drafts, 1)
+        starts = list(range(0, n_drafts, shard_size))
 
-        # Builds up static values as lists to later add to dataframes
-        draft_num_list = [None]*self.n_packs
-        pick_num_list = [None]*self.n_packs
-        human_pick_list = [None]*self.n_packs
+        # Reads back shards already done, and lists the bots missing from every other shard
+        shard_results = {start: [None]*len(bots) for start in starts}
+        todo = []
+        for start in starts:
+            missing = []
+            for bot_counter in range(len(bots)):
+                if output_dir is not None and start in bot_entries[bot_counter]['shards']:
+                    chunk_path = os.path.join(output_dir, bot_entries[bot_counter]['dir'], "%d.npz" % start)
+                    shard_results[start][bot_counter] = _load_chunk(chunk_path)
+                else:
+                    missing.append(bot_counter)
+            if missing:
+                todo.append((start, missing))
 
-        # Fills in dataframes of correct choices
-        temp_names = []
-        before = datetime.datetime.now()
-        static_cols = ['draft_num', 'pick_num', 'human_pick']
+        # Evaluates missing bots on their shards, in draft order
+        jobs = (([bots[i] for i in missing], self.drafts[start:start+shard_size], mode, 
+                 self.METRICS, self.BATCH_SIZE, self.LATENCY_SAMPLES) for start, missing in todo)
+        for (start, missing), results in zip(todo, map_jobs(_evaluate_shard, jobs, n_jobs)):
+            for bot_counter, result in zip(missing, results):
+                shard_results[start][bot_counter] = result
+                if output_dir is not None:
+                    bot_entry = bot_entries[bot_counter]
+                    _save_chunk(os.path.join(output_dir, bot_entry['dir'], "%d.npz" % start), result)
+                    bot_entry['shards'].append(start)
+            if output_dir is not None:
+                _write_manifest(output_dir, manifest)
+
+        # Stores per-pick results of every bot
         for bot_counter in range(len(bots)): # AKh: better to rename to iBot
             bot = bots[bot_counter]
-            all_correct = [None]*self.n_packs
-            all_fuzzy = all_correct.copy()
-            all_rank_error = all_correct.copy()
-            pack_counter = 0
-            for draft_num in range(len(self.drafts)):
-                draft = self.drafts[draft_num]
-                collection = []
-                for pick_num in range(len(draft)):
-                    pack = draft[pick_num]
-
-                    # Stores draft and pick number in dataframes if uninitialized
-                    if initialize: 
-                        draft_num_list[pack_counter] = draft_num + 1
-                        pick_num_list[pack_counter] = pick_num + 1
-                        human_pick_list[pack_counter] = pack[0]
-
-                    # Gets bot ranking on the current pack
-                    pack_rank = bot.rank_pack([pack, collection])
-                    collection.append(bot.get_top_pick(pack_rank))
-
-                    # Gets top-one and top-three accuracy for the current pack
-                    exact_correct = self.is_bot_correct(pack, pack_rank)
-                    fuzzy_correct = self.is_bot_correct(pack, pack_rank, fuzzy = True)
-                    rank_error = self.get_rank_error(pack, pack_rank)
-
-                    # Stores accuracy in dataframes
-                    all_correct[pack_counter] = exact_correct[1]
-                    all_fuzzy[pack_counter] = fuzzy_correct[1]
-                    all_rank_error[pack_counter] = rank_error[1]
-                    pack_counter += 1
-
-            # Only initializes dataframe values once
-            if initialize:
-                self.correct['draft_num'] = draft_num_list
-                self.correct['pick_num'] = pick_num_list
-                self.correct['human_pick'] = human_pick_list
-                self.fuzzy_correct['draft_num'] = draft_num_list
-                self.fuzzy_correct['pick_num'] = pick_num_list
-                self.fuzzy_correct['human_pick'] = human_pick_list
-                self.rank_error['draft_num'] = draft_num_list
-                self.rank_error['pick_num'] = pick_num_list
-                self.rank_error['human_pick'] = human_pick_list
-                initialize = False
-
-            # Stores accuracy info in a single column of existing dataframes
+            bot_results = [shard_results[start][bot_counter] for start in starts]
+            time_taken = sum((results[4] for results in bot_results), datetime.timedelta(0))
+
+            # Workers updated copies of the bot, and shards read back were counted by an earlier run
+            evaluated = {start for start, missing in todo if bot_counter in missing}
+            for start, results in zip(starts, bot_results):
+                if n_jobs > 1 or start not in evaluated:
+                    bot.num_total += results[3][0]
+                    bot.num_correct += results[3][1]
+
             bot_name = bot_names[bot_counter]
-            self.correct[bot_name] = all_correct
-            self.fuzzy_correct[bot_name] = all_fuzzy
-            self.rank_error[bot_name] = all_rank_error
-            current = datetime.datetime.now() 
-            print(bot_name + " time taken: " + str(current - before))
-            before = current
-
-        # Fills in dataframes of per-card accuracies
-        unique_cards = np.sort(self.correct['human_pick'].unique())
-        self.card_acc['human_pick'] = unique_cards # All card names; human_pick is just where they came from
+            self.results[bot_name] = {metric: np.concatenate([results[i] for results in bot_results] + 
+                                                             [np.zeros(0, dtype=np.int8)])
+                                      for i, metric in enumerate(self.METRICS)}
+            self.modes[bot_name] = mode
+            self._store_timings(bot_name, mode, bot_results)
+            print(bot_name + " (" + mode + ") time taken: " + str(time_taken))
+        if n_jobs > 1:
+            print("Wall time taken: " + str(datetime.datetime.now() - before))
+        self._frames = {}
+
+    def load_evaluations(self, output_dir, bot_names = None):
+        """Reads results of bots checkpointed by evaluate_bots(output_dir = output_dir).
+
+        :param output_dir: Directory of the checkpointed evaluation.
+        :param bot_names: (Optional) Names of the bots to read. By default, all bots done with 
+                          every shard are read, and unfinished bots are skipped.
+        """
+        manifest = _read_manifest(output_dir)
+        if manifest is None:
+            raise ValueError("No evaluation in " + str(output_dir))
+        if manifest['fingerprint'] != self._get_fingerprint():
+            raise ValueError("The evaluation in %s is of other drafts" % output_dir)
+        starts = list(range(0, len(self.drafts), manifest['shard_size']))
+        if bot_names is None:
+            bot_names = [bot_name for bot_name, bot_entry in manifest['bots'].items() 
+                         if set(starts) <= set(bot_entry['shards'])]
         for bot_name in bot_names:
-            accuracies = []
-            for human_pick in unique_cards:
-                all_picks = self.correct.loc[self.correct['human_pick'] == human_pick]
-                accuracies.append(all_picks[bot_name].sum() / all_picks.shape[0])
-            self.card_acc[bot_name] = accuracies
+            bot_entry = manifest['bots'][bot_name]
+            if not set(starts) <= set(bot_entry['shards']):
+                raise ValueError("%s is not done with all drafts in %s" % (bot_name, output_dir))
+            bot_results = [_load_chunk(os.path.join(output_dir, bot_entry['dir'], "%d.npz" % start)) for start in starts]
+            self.results[bot_name] = {metric: np.concatenate([results[i] for results in bot_results] + 
+                                                             [np.zeros(0, dtype=np.int8)])
+                                      for i, metric in enumerate(self.METRICS)}
+            self.modes[bot_name] = bot_entry['mode']
+            self._store_timings(bot_name, bot_entry['mode'], bot_results)
+        self._frames = {}
+
+    def get_sample_order(self, rng = None):
+        """Returns all draft indices in a random order stratified by draft length and by position.
+
+        Drafts are grouped into strata by length and by block of the draft list (SAMPLE_BLOCKS
+        equal blocks), shuffled within each stratum and interleaved in proportion to stratum 
+        sizes, so that every prefix of the order is a stratified sample.
+        """
+        rng = np.random if rng is None else rng
+        n_drafts = len(self.drafts)
+        draft_lengths = np.array([len(draft) for draft in self.drafts], dtype=np.int64)
+        blocks = np.arange(n_drafts) * self.SAMPLE_BLOCKS // max(n_drafts, 1)
+        strata = np.unique(draft_lengths * self.SAMPLE_BLOCKS + blocks, return_inverse = True)[1].reshape(-1)
+        sizes = np.bincount(strata)
+
+        # Random rank of each draft within its stratum, spread evenly over [0, 1)
+        shuffled = rng.permutation(n_drafts)
+        shuffled_strata = strata[shuffled]
+        by_stratum = np.argsort(shuffled_strata, kind = 'stable')
+        ranks = np.empty(n_drafts)
+        ranks[by_stratum] = np.arange(n_drafts) - (np.cumsum(sizes) - sizes)[shuffled_strata[by_stratum]]
+        keys = (ranks + rng.random_sample(n_drafts)) / sizes[shuffled_strata]
+        return shuffled[np.argsort(keys, kind = 'stable')]
+
+    def get_estimates(self, ci = 0.95, seed = None, bot_names = None):
+        """Returns a DataFrame of the mean of every metric of sampled evaluations, with bootstrap
+        confidence intervals over drafts, see bootstrap_ratio.
+
+        :param ci: (Optional) Confidence level.
+        :param seed: (Optional) Random seed of the bootstrap.
+        :param bot_names: (Optional) Bots to report, by default all in self.sample_results.
+        """
+        rows = []
+        for bot_name in (self.sample_results if bot_names is None else bot_names):
+            drafts = self.sample_results[bot_name]['drafts']
+            for metric in self.METRICS:
+                sums, counts = self._get_draft_sums(bot_name, metric)
+                estimate, low, high = bootstrap_ratio(sums, counts, ci, self.BOOTSTRAP_SAMPLES, 
+                                                      np.random.RandomState(seed))
+                rows.append({'bot': bot_name, 'mode': self.sample_results[bot_name]['mode'], 
+                             'metric': metric, 'estimate': estimate, 'low': low, 'high': high, 
+                             'n_drafts': len(drafts), 'n_picks': int(counts.sum())})
+        return pd.DataFrame(rows, columns = ['bot', 'mode', 'metric', 'estimate', 'low', 'high', 'n_drafts', 'n_picks'])
+
+    def compare_bots(self, bot_name, baseline_name, ci = 0.95, seed = None):
+        """Returns a DataFrame of paired differences bot - baseline of every metric of sampled 
+        evaluations, on the drafts both bots were evaluated on, with bootstrap confidence 
+        intervals. An interval that excludes 0 is a significant difference at level ci.
+        """
+        rows = []
+        for metric in self.METRICS:
+            drafts, sums, counts = self._get_draft_sums(bot_name, metric, with_drafts = True)
+            base_drafts, base_sums, base_counts = self._get_draft_sums(baseline_name, metric, with_drafts = True)
+            common, i, j = np.intersect1d(drafts, base_drafts, return_indices = True)
+            difference, low, high = bootstrap_ratio(sums[i] - base_sums[j], counts[i], ci, 
+                                                    self.BOOTSTRAP_SAMPLES, np.random.RandomState(seed))
+            rows.append({'metric': metric, 'difference': difference, 'low': low, 'high': high, 
+                         'n_drafts': len(common), 'n_picks': int(counts[i].sum())})
+        return pd.DataFrame(rows, columns = ['metric', 'difference', 'low', 'high', 'n_drafts', 'n_picks'])
+
+    def _get_draft_sums(self, bot_name, metric, with_drafts = False):
+        """Returns the sum of a metric and the number of picks of every draft of a sampled evaluation."""
+        sample = self.sample_results[bot_name]
+        draft_lengths = np.array([len(self.drafts[i]) for i in sample['drafts']], dtype=np.intp)
+        units = np.repeat(np.arange(len(draft_lengths)), draft_lengths)
+        sums = np.bincount(units, weights = sample[metric], minlength = len(draft_lengths))
+        if with_drafts:
+            return sample['drafts'], sums, draft_lengths
+        return sums, draft_lengths
+
+    def _evaluate_sample(self, bots, bot_names, n_jobs, mode, sample, ci, seed, target_width):
+        """Evaluates bots on a stratified sample of drafts, see evaluate_bots."""
+        before = datetime.datetime.now()
+        n_drafts = len(self.drafts)
+        n_sample = int(np.ceil(sample * n_drafts)) if isinstance(sample, float) else int(sample)
+        order = self.get_sample_order(np.random.RandomState(seed))[:max(0, min(n_sample, n_drafts))]
+        if len(order) == 0:
+            raise ValueError("No drafts to sample")
+        if target_width is not None and not isinstance(target_width, dict):
+            target_width = {metric: target_width for metric in self.ACCURACY_METRICS}
+
+        # Evaluates batches of the sample until it is done, or the intervals are narrow enough
+        bot_results = [[] for bot in bots]
+        n_done = 0
+        while n_done < len(order):
+            batch = [self.drafts[i] for i in order[n_done:n_done + self.SAMPLE_BATCH]]
+            shard_size = max(1, -(-len(batch) // n_jobs))
+            jobs = ((bots, batch[i:i+shard_size], mode, self.METRICS, self.BATCH_SIZE, self.LATENCY_SAMPLES) 
+                    for i in range(0, len(batch), shard_size))
+            for results in map_jobs(_evaluate_shard, jobs, n_jobs):
+                for bot_counter, result in enumerate(results):
+                    bot_results[bot_counter].append(result)
+                    if n_jobs > 1: # Workers updated copies of the bot
+                        bots[bot_counter].num_total += result[3][0]
+                        bots[bot_counter].num_correct += result[3][1]
+            n_done += len(batch)
+
+            for bot_counter, bot_name in enumerate(bot_names):
+                self.sample_results[bot_name] = {metric: np.concatenate([results[i] for results in bot_results[bot_counter]])
+                                                 for i, metric in enumerate(self.METRICS)}
+                self.sample_results[bot_name].update(drafts = order[:n_done], mode = mode)
+            if target_width is not None:
+                estimates = self.get_estimates(ci, seed, bot_names)
+                widths = estimates['high'] - estimates['low']
+                limits = estimates['metric'].map(target_width)
+                if (widths[limits.notna()] <= limits[limits.notna()]).all():
+                    break
+
+        # Reports estimates of every bot
+        estimates = self.get_estimates(ci, seed, bot_names).set_index(['bot', 'metric'])
+        for bot_counter, bot_name in enumerate(bot_names):
+            time_taken = sum((results[4] for results in bot_results[bot_counter]), datetime.timedelta(0))
+            self._store_timings(bot_name, mode, bot_results[bot_counter])
+            print(bot_name + " (" + mode + ") time taken: " + str(time_taken))
+            for metric in self.METRICS:
+                row = estimates.loc[(bot_name, metric)]
+                print("  %s: %.4f [%.4f, %.4f] on %d drafts" % (metric, row['estimate'], row['low'], row['high'], n_done))
+        if n_jobs > 1:
+            print("Wall time taken: " + str(datetime.datetime.now() - before))
+        self._frames = {}
+
+    def _get_fingerprint(self):
+        """Returns a hash of the drafts' lengths and human picks, identifying an evaluation's drafts."""
+        digest = hashlib.sha1(np.array([len(draft) for draft in self.drafts], dtype=np.int64).tobytes())
+        digest.update("\n".join(self.card_names).encode())
+        digest.update(self.human_pick_ids.tobytes())
+        return digest.hexdigest()
+
+    def _open_evaluation(self, output_dir, shard_size, n_jobs):
+        """Returns the manifest of a checkpointed evaluation, starting it if needed."""
+        manifest = _read_manifest(output_dir)
+        if manifest is None:
+            if shard_size is None:
+                shard_size = max(1, min(self.CHECKPOINT_SHARD_SIZE, -(-len(self.drafts) // (4*n_jobs))))
+            os.makedirs(output_dir, exist_ok = True)
+            return {'version': EVALUATION_VERSION, 'fingerprint': self._get_fingerprint(), 
+                    'n_drafts': len(self.drafts), 'n_picks': int(self.n_packs), 'shard_size': shard_size, 
+                    'bots': {}}
+        if manifest['fingerprint'] != self._get_fingerprint():
+            raise ValueError("The evaluation in %s is of other drafts" % output_dir)
+        if shard_size is not None and shard_size != manifest['shard_size']:
+            raise ValueError("The evaluation in %s uses shards of %d drafts" % (output_dir, manifest['shard_size']))
+        return manifest
+
+    def _get_bot_entry(self, manifest, bot_name, mode):
+        """Returns the manifest entry of a bot, adding it with its own directory if needed."""
+        if bot_name not in manifest['bots']:
+            bot_dir = "bot%d" % len(manifest['bots'])
+            manifest['bots'][bot_name] = {'mode': mode, 'dir': bot_dir, 'shards': []}
+        bot_entry = manifest['bots'][bot_name]
+        if bot_entry['mode'] != mode:
+            raise ValueError("%s was evaluated in %s mode" % (bot_name, bot_entry['mode']))
+        return bot_entry
 
     def write_evaluations(self, exact_filename = "output_files/exact_correct.tsv", fuzzy_filename = "output_files/fuzzy_correct.tsv", 
-                          rank_error_filename = "output_files/rank_error.tsv", acc_filename = "output_files/card_accuracies.tsv"):
-        """Writes correctness and accuracy DataFrames to filenames.
+                          rank_error_filename = "output_files/rank_error.tsv", acc_filename = "output_files/card_accuracies.tsv",
+                          pick_acc_filename = "output_files/pick_accuracies.tsv", pack_acc_filename = "output_files/pack_accuracies.tsv",
+                          timing_filename = "output_files/bot_timings.tsv"):
+        """Writes correctness, accuracy and timing DataFrames to filenames.
         """
         self.correct.to_csv(exact_filename, sep = "\t", index = False)
         print("Wrote correct to: " + str(exact_filename))
@@ -133,6 +794,12 @@ class BotTester(object):
         print("Wrote rank_error to: " + str(rank_error_filename))
         self.card_acc.to_csv(acc_filename, sep = "\t", index = False)
         print("Wrote card_acc to: " + str(acc_filename))
+        self.pick_acc.to_csv(pick_acc_filename, sep = "\t", index = False)
+        print("Wrote pick_acc to: " + str(pick_acc_filename))
+        self.pack_acc.to_csv(pack_acc_filename, sep = "\t", index = False)
+        print("Wrote pack_acc to: " + str(pack_acc_filename))
+        self.timing.to_csv(timing_filename, sep = "\t", index = False)
+        print("Wrote timing to: " + str(timing_filename))
     
     def report_evaluations(self):
         '''Reports some minimal info on bot running results in the notebook,
@@ -140,6 +807,48 @@ class BotTester(object):
         
         print(np.mean(self.correct))
     
+    @staticmethod
+    def get_human_rank(pack, pack_rank):
+        """ Returns the rank of the human's pick pack[0] among the bot's choices in pack_rank.
+
+        Equivalent to the position of the human pick in pack_rank sorted by decreasing value,
+        ties kept in pack_rank order, or len(pack_rank) if the human pick is not ranked. Computed
+        in a single pass, without sorting: 0 means the bot's top choice matched the human's
+        choice, and a rank below 3 means the human's choice is in the bot's top 3.
+        """
+        human_pick = pack[0]
+        if human_pick not in pack_rank:
+            return len(pack_rank)
+        human_value = pack_rank[human_pick]
+        rank = 0
+        seen_human = False
+        for card, value in pack_rank.items():
+            if card == human_pick:
+                seen_human = True
+            elif value > human_value or (value == human_value and not seen_human):
+                rank += 1
+        return rank
+    
+    @staticmethod
+    def get_human_ranks(packs, scores):
+        """ Vectorized get_human_rank for score matrices of Bot.rank_packs.
+
+        Each distinct card of a pack counts once, -inf scores are unranked, and ties are kept
+        in pack order, so the human pick (first card) ranks ahead of cards with equal scores.
+
+        :param packs: Int array (n_frames, max_pack) of card ids, padded with -1.
+        :param scores: Float array (n_frames, max_pack) from Bot.rank_packs.
+
+        :return: Tuple of int arrays (n_frames,): rank of the human pick and number of ranked cards.
+        """
+        valid = packs >= 0
+        earlier = np.tril(np.ones([packs.shape[1]]*2, dtype=bool), -1)
+        repeated = ((packs[:, :, None] == packs[:, None, :]) & earlier[None]).any(axis=2)
+        ranked = valid & ~repeated & (scores > -np.inf)
+        others = ranked & (packs != packs[:, :1])
+        rank_error = (others & (scores > scores[:, :1])).sum(axis=1)
+        return rank_error, ranked.sum(axis=1)
+    
     def is_bot_correct(self, pack, pack_rank, fuzzy = False):
         """ Checks whether or not a bot's pick matches a human's pick.
         
@@ -147,31 +856,13 @@ class BotTester(object):
         bot's top choice matched the human's choice. If fuzzy = True, then
         instead the bot is correct if the human's choice is in bot's top 3
         """
-        bot_correct = 0
-        human_pick = pack[0]
-        pack_rank = sorted(pack_rank, key = pack_rank.get, reverse = True)
-        if not fuzzy:
-            bot_pick = pack_rank[0]
-            if human_pick == bot_pick:
-                bot_correct = 1
-        elif fuzzy:
-            for i in range(min(len(pack_rank), 3)):
-                bot_pick = pack_rank[i]
-                if human_pick == bot_pick:
-                    bot_correct = 1
-        return (human_pick, bot_correct)
+        rank = self.get_human_rank(pack, pack_rank)
+        bot_correct = int(rank < min(len(pack_rank), 3 if fuzzy else 1))
+        return (pack[0], bot_correct)
     
     def get_rank_error(self, pack, pack_rank):
         """ Checks the rank error between a bot pick and a human pick.
         
         Returns a tuple of (cardname, rank_error) for the rank of the human's choice. 
         """
-        rank_error = 0
-        human_pick = pack[0]
-        pack_rank = sorted(pack_rank, key = pack_rank.get, reverse = True)
-        for card in pack_rank:
-            if card == human_pick:
-                break
-            rank_error += 1
-        return (pack[0], rank_error)
-
+        return (pack[0], self.get_human_rank(pack, pack_rank))
@@ -42,6 +42,13 @@ class ClassicBot(Bot):
         Rating: draftsim rating from -1 for lands, and up to 5 or something
         Color Vector: something like [0, 0, 1, 1, 1]  or [0, 0, 2, 0, 0]'''
         
+        # Contiguous arrays compiled from card_set, indexed in label-encoder order
+        self.le = create_le(self.card_set.index.values)
+        self.card_index = {str(name): i for i, name in enumerate(self.le.classes_)}
+        compiled = self.card_set.loc[self.le.classes_]
+        self.ratings = compiled['Rating'].values.astype(float)                                 # (n_cards,)
+        self.colors = np.array([list(cv) for cv in compiled['Color Vector']], dtype=float) # (n_cards, 5)
+        
     def rank_pack(self, draft_frame):
         pack_rank = self.__get_ranking(draft_frame)
         top_pick = self.get_top_pick(pack_rank)
@@ -53,19 +60,32 @@ class ClassicBot(Bot):
     def __get_ranking(self, draft_frame):
         pack = draft_frame[0]
         collection = draft_frame[1] 
-        color_commit = self.get_color_commitment(collection)
-        evaluated_pack = [self.get_color_bias(card, color_commit) + 
-                          float(self.card_set.loc[card]['Rating']) for card in pack]
+        if self.is_tracking(collection):
+            color_commit = self.draft_commitment
+        else:
+            color_commit = self.get_color_commitment(collection)
+        pack_indices = [self.card_index[card] for card in pack]
+        evaluated_pack = (self.get_color_bias_vector(pack_indices, color_commit) + 
+                          self.ratings[pack_indices]).tolist()
         self.eval_pack = evaluated_pack              
         return {draft_frame[0][i]:evaluated_pack[i] for i in range(len(pack))}
     
+    def begin_draft(self):
+        super(ClassicBot, self).begin_draft()
+        self.draft_commitment = np.zeros(5) # Running get_color_commitment(collection)
+        
+    def observe_pick(self, card):
+        super(ClassicBot, self).observe_pick(card)
+        self.draft_commitment = self.draft_commitment + self.get_card_colors(card)
+    
     def get_color_commitment(self, collection):
-        temp_color_commitment = [0,0,0,0,0]
+        indices = []
         for card in collection:
-            new_card = self.get_card_colors(card)
-            # pythonic vector addition
-            temp_color_commitment = list(map(sum, zip(new_card, temp_color_commitment)))
-        return temp_color_commitment
+            if card in self.card_index:
+                indices.append(self.card_index[card])
+            else:
+                self.get_card_colors(card) # Reports the unexpected card, no color identity
+        return self.colors[indices].sum(axis=0)
     
     def get_color_bias(self, card, commitment):
         card_colors = self.get_card_colors(card)
@@ -155,13 +175,71 @@ class ClassicBot(Bot):
 
             return bias
         
+    def get_color_bias_vector(self, pack_indices, commitment):
+        '''Vectorized get_color_bias() for all cards of a pack at once.
+        
+        pack_indices: card indices into self.colors, see self.card_index
+        commitment: color commitment, see get_color_commitment()
+        Returns an array of color biases, equal to get_color_bias() for each card.'''
+        pack_indices = np.asarray(pack_indices, dtype=np.intp).reshape(1, -1)
+        return self.get_color_bias_matrix(pack_indices, np.asarray(commitment, dtype=float)[None])[0]
+        
+    def get_color_bias_matrix(self, pack_indices, commitment):
+        '''get_color_bias() for all cards of many packs at once, each with its own commitment.
+        
+        pack_indices: int array (n_frames, n_pack) of card indices into self.colors
+        commitment: array (n_frames, 5) of color commitments, see get_color_commitment()
+        Returns an array (n_frames, n_pack) of color biases.'''
+        card_colors = self.colors[pack_indices]                               # (n_frames, n_pack, 5)
+        commitment = np.asarray(commitment, dtype=float)                      # (n_frames, 5)
+        num_card_colors = np.count_nonzero(card_colors, axis=2)               # (n_frames, n_pack)
+        num_commit_colors = np.count_nonzero(commitment >= self.COLOR_COMMIT_THRESHOLD, axis=1)
+
+        denom = self.COLOR_COMMIT_THRESHOLD / self.MAX_BONUS_SPEC
+        
+        # 4-5 color cards get no bonus
+        bias = np.zeros(num_card_colors.shape)
+        
+        # 0 color cards: bonus only when the player is committed to 2+ colors
+        colorless = (num_card_colors == 0) & (num_commit_colors > 1)[:, None]
+        colorless_bias = np.minimum(self.MAX_BONUS_SPEC, commitment.max(axis=1, initial=-np.inf) / denom)
+        bias = np.where(colorless, colorless_bias[:, None], bias)
+            
+        # 2-3 color cards: on-color commitment minus off-color commitment
+        multicolor = (num_card_colors == 2) | (num_card_colors == 3)
+        signed = np.where(card_colors > 0, commitment[:, None, :], -commitment[:, None, :])
+        bias = np.where(multicolor, signed.sum(axis=2) - self.MULTICOLOR_PENALTY, bias)
+        
+        # 1 color cards
+        color_index = np.argmax(card_colors, axis=2)
+        mono_bias = np.minimum(self.MAX_BONUS_SPEC, np.take_along_axis(commitment, color_index, axis=1) / denom)
+        # if player only has cards of one color
+        single = (num_commit_colors > 0) & (np.count_nonzero(commitment, axis=1) == 1)
+        mono_bias = np.where(single[:, None], mono_bias / self.SINGLE_COLOR_BIAS_FACTOR, mono_bias)
+        # if player is committed to only one color, bonus for the second highest color
+        second = (num_commit_colors == 1)[:, None] & (color_index == np.argsort(commitment, axis=1)[:, -2:-1])
+        mono_bias = np.where(second, np.maximum(self.SECOND_COLOR_FRACTION * self.COLOR_COMMIT_THRESHOLD / denom,
+                                                mono_bias), mono_bias)
+        bias = np.where(num_card_colors == 1, mono_bias, bias)
+        return bias
+
+    def rank_packs(self, packs, collections):
+        '''Batched ranking, see Bot.rank_packs. Card ids are labels of self.le.'''
+        packs = np.asarray(packs, dtype=np.intp)
+        collections = np.asarray(collections, dtype=np.intp)
+        pack_indices = np.where(packs >= 0, packs, 0)
+        commitment = (self.colors[collections] * (collections >= 0)[:, :, None]).sum(axis=1)
+        scores = self.get_color_bias_matrix(pack_indices, commitment) + self.ratings[pack_indices]
+        scores[packs < 0] = -np.inf
+        return scores
+        
     def get_card_colors(self, card):
         try:
-            temp = self.card_set.loc[card]['Color Vector']
-        except:
+            temp = self.colors[self.card_index[card]]
+        except KeyError:
             print("Unexpected card:",card," Assuming no color identity")
-            temp = [0,0,0,0,0]
+            temp = np.zeros(5)
         return temp
     
     def get_card_cost(self, card):
-        return np.sum(self.card_set.loc[card]['Color Vector'])
\ No newline at end of file
+        return np.sum(self.colors[self.card_index[card]])
\ No newline at end of file
@@ -5,14 +5,34 @@
   Utilities for loading draftsim set and draft files.
 """
 
+from collections import deque
+import functools
+import io
+import itertools
+import json
+import multiprocessing
+import pickle
 import re
 
 import numpy as np
 import pandas as pd
 from sklearn import preprocessing
 import torch
+from torch.utils.data import BatchSampler, DataLoader, RandomSampler, SequentialSampler
 from torch.utils.data.dataset import Dataset
 
+#Default number of characters read from a draft file at a time.
+DEFAULT_CHUNK_BYTES = 2**22
+
+#Default number of drafts handled by a worker process at a time.
+DEFAULT_BATCH_SIZE = 1000
+
+#Version of the on-disk draft store format, see save_draft_store().
+DRAFT_STORE_VERSION = 1
+
+#Suffixes distinguishing basic land arts in draftsim data.
+BASIC_LAND_SUFFIXES = ["_1", "_2", "_3", "_4"]
+
 
 def create_set(path1, path2=None, alphabetical=True):
     """Load set data from the draftsim ratings google doc.
@@ -34,8 +54,7 @@ def create_set(path1, path2=None, alphabetical=True):
   
     #If provided, load data from supplementary file. 
     if path2 is not None:
-        rd = rd.append(pd.read_csv(path2, delimiter="\t"))
-        rd = rd.reset_index(drop=True)
+        rd = pd.concat([rd, pd.read_csv(path2, delimiter="\t")], ignore_index=True)
         
     #Add color information to dataframe.
     add_color_vec(rd)
@@ -152,105 +171,351 @@ def fix_commas(set_var, drafts):
     :return set_var: Set variable with problematic characters removed.
     :return drafts: Draft data variable with problematic characters removed.
     """
-    
-    #Remove quote characters from draft.
-    drafts = re.sub('"', '', drafts)
-    
-    #Identify names with commas.
-    comma_names = []
-    for name in set_var["Name"]:
-        if "," in name:
-            comma_names.append(name)
-    
-    #Remove commas from drafts.
-    for name in comma_names:
-        fixed_name = re.sub(",", "", name)
-        drafts = re.sub(name, fixed_name, drafts)
-
-    #Make basic lands unique.
-    basic_land_suffixes = ["_1", "_2", "_3", "_4"]
-    for s in basic_land_suffixes:
-        drafts = re.sub(s, "", drafts)
+    drafts = NameNormalizer(set_var["Name"])(drafts)
+    set_var = fix_set_names(set_var)
+    return set_var, drafts
+
+class NameNormalizer(object):
+    """Removes quotes, cardname commas and basic land suffixes from drafts.
+
+    All replacements are compiled into a single regular expression, so raw
+    draft data is rewritten in one pass regardless of how many cardnames 
+    contain commas. Cardnames are escaped, not treated as patterns.
+
+    Works on any piece of raw draft data, from a single line to a whole file:
+        normalize = NameNormalizer(set_var["Name"])
+        drafts = normalize(drafts)
+    """
+
+    def __init__(self, names):
+        """Build the replacement table.
+
+        :param names: Original cardnames of the set, as in set_var["Name"].
+        """
+        self.table = {'"': ""}
+        for s in BASIC_LAND_SUFFIXES:
+            self.table[s] = ""
+        for name in names:
+            if "," in name:
+                fixed_name = name.replace('"', "").replace(",", "")
+                for s in BASIC_LAND_SUFFIXES:
+                    fixed_name = fixed_name.replace(s, "")
+                self.table[name] = fixed_name
         
+        #Longest keys first, so that cardnames win over their substrings.
+        keys = sorted(self.table, key=len, reverse=True)
+        self.pattern = re.compile("|".join(re.escape(k) for k in keys))
+
+    def __call__(self, drafts):
+        """Return raw draft string with problematic characters removed."""
+        return self.pattern.sub(self.replace, drafts)
+
+    def replace(self, match):
+        return self.table[match.group(0)]
+
+def fix_set_names(set_var):
+    """Removes commas and basic land suffixes from cardnames in a set variable.
+
+    :param set_var: Set variable with problematic characters.
+    :return: Copy of the set variable with problematic characters removed, 
+             and with a single row per basic land.
+    """
+    set_var = set_var.copy()
+    
     #Remove commas from set variable.
-    for removal_char in basic_land_suffixes + [","]:
+    for removal_char in BASIC_LAND_SUFFIXES + [","]:
         set_var["Name"] = [re.sub(removal_char, "", name) for name in set_var["Name"]]
     
     #Make basic lands unique in set variables. 
     set_var = set_var.drop_duplicates(subset=["Name"]).reset_index(drop=True)
-    return set_var, drafts
+    return set_var
+
+@functools.lru_cache(maxsize=None)
+def get_pick_order(pack_size, n_players=8):
+    """Return the token positions of the cards seen at each pick of a draft.
+
+    Only depends on the draft geometry, so it is computed once per pack size 
+    and number of players. 
+
+    :param pack_size: Number of cards in a pack.
+
+    :param n_players: (Optional) Number of players at the table.
+
+    :return: Tuple of 3*pack_size tuples. Tuple i holds the positions, within 
+             the drafted cards of a draft, of the cards in the pack shown to 
+             the user at pick i. The card picked by the user comes first.
+    """
+    ps = pack_size
+    n_cards = 3*n_players*ps   # All drafted cards in a row, first human pile, then all bots; 3*ps cards in each pile
+    pick_order = []
+    for pack, step in [(0, 3*ps+1), (1, -3*ps+1), (2, 3*ps+1)]:
+        for pick in range(ps):                          # For each card in the final pile, reconstruct the hand.
+            start = pack*ps + pick                      # Packs are PS deep in each pile
+            cur_pick = tuple((start + k*step) % n_cards # Step size: 3ps to move to next player + 1 to get next card
+                             for k in range(ps-pick))   # If player2 drafted card at step2, player1 saw it at step1 etc.
+            pick_order.append(cur_pick)                 # Pack 2 goes in the opposite direction.
+    return tuple(pick_order)
+
+@functools.lru_cache(maxsize=None)
+def get_pick_index_table(pack_size, n_players=8):
+    """Return get_pick_order() as a (3*pack_size, pack_size) gather table.
+
+    Positions past the end of a pack are set to -1.
+
+    :param pack_size: Number of cards in a pack.
+
+    :param n_players: (Optional) Number of players at the table.
 
-def sort_draft(single_draft):
+    :return: Read-only numpy array of token positions.
+    """
+    table = np.full([3*pack_size, pack_size], -1, dtype=np.int64)
+    for i, cur_pick in enumerate(get_pick_order(pack_size, n_players)):
+        table[i, :len(cur_pick)] = cur_pick
+    table.setflags(write=False)
+    return table
+
+def sort_draft(single_draft, n_players=8):
     """Given a single draft string, process that string into a list of picks.
 
     :param single_draft: A list of unsorted draft tokens from database.
 
+    :param n_players: (Optional) Number of players at the table.
+
     :return: A list of picks of length 3*ps. Each pick is a list of cardnames 
              in the pack shown to the user. The card picked by the user is 
              always the top card.
+
+    :raises ValueError: If the number of drafted cards does not fit a draft.
     """
 
-    #Extract picks from draft.
-    picks = single_draft[2:]  # PICKS is all drafted cards in a row, first human pile, then all bots; 3*ps cards in each pile
-    pick_list = []
-    
-    #Get the pack size. 
-    ps = int(len(picks) / 24) # 24=8*3: 8 players, 3 packs. PICKS is 3*8*packsize (ps) long.
-
-    #Track all picks in pack 1.
-    for pick in range(ps):                                # For each card in the final pile, reconstruct the hand.
-        cur_pick = []                                     # A hand player was starting at, while picking PICKth card.
-        for x in range(pick, (3*ps+1)*(ps-pick), 3*ps+1): # Step size: 3ps to move to next player + 1 to get next card
-                                                          # If player2 drafted card at step2, player1 saw it at step1 etc.
-            x = x % (24*ps)                               # Cheat to avoid manual wrapping up after 8th pick.
-            cur_pick.append(picks[x])                     # Populate the hand
-        pick_list.append(cur_pick)                        # Save the hand
+    #Extract picks from draft, ignoring trailing empty tokens.
+    picks = single_draft[2:]
+    while len(picks) > 0 and picks[-1] == "":
+        picks = picks[:-1]
     
-    #Track all picks in pack 2.
-    for pick in range(ps):
-        cur_pick = []
-        for x in range(ps+pick, (-3*ps+1)*(ps-1-pick), -3*ps+1): # Same, but opposite direction, and PS deep in each pile
-            x = x % (24*ps)
-            cur_pick.append(picks[x])
-        pick_list.append(cur_pick)
-
-    #Track all picks in pack 3.
-    for pick in range(ps):
-        cur_pick = []
-        for x in range(2*ps+pick, (3*ps+1)*(ps-pick), 3*ps+1):   # Again positive direction, 2*PS deep in the pile
-            x = x % (24*ps)
-            cur_pick.append(picks[x])            
-        pick_list.append(cur_pick)        
-    return pick_list
-
-def process_drafts(drafts, print_every=10000):
+    #Get the pack size. PICKS is 3*8*packsize (ps) long.
+    if len(picks) % (3*n_players) != 0:
+        raise ValueError("Expected a multiple of " + str(3*n_players) + 
+                         " drafted cards, got " + str(len(picks)) + ".")
+    ps = len(picks) // (3*n_players)
+
+    return [[picks[x] for x in cur_pick] for cur_pick in get_pick_order(ps, n_players)]
+
+def sort_drafts_batch(token_matrix, n_players=8, pad_value=0):
+    """Sort many drafts at once, see sort_draft().
+
+    :param token_matrix: Array of shape (n_drafts, 3*n_players*ps) holding the
+                         drafted cards of each draft, e.g. as label encoded 
+                         card indices.
+
+    :param n_players: (Optional) Number of players at the table.
+
+    :param pad_value: (Optional) Value used past the end of each pack. 
+
+    :return: Array of shape (n_drafts, 3*ps, ps). Element [d, i] is the pack 
+             shown to the user at pick i of draft d, human pick first.
+    """
+    token_matrix = np.asarray(token_matrix)
+    if token_matrix.ndim != 2 or token_matrix.shape[1] % (3*n_players) != 0:
+        raise ValueError("Expected a token matrix of shape (n_drafts, " + 
+                         str(3*n_players) + "*ps), got " + str(token_matrix.shape) + ".")
+    ps = token_matrix.shape[1] // (3*n_players)
+    table = get_pick_index_table(ps, n_players)
+
+    #Index -1 selects the padding column.
+    pad = np.full([len(token_matrix), 1], pad_value, dtype=token_matrix.dtype)
+    return np.concatenate([token_matrix, pad], axis=1)[:, table]
+
+def iter_lines(f, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Yield the lines of an open text file, reading it chunk by chunk.
+
+    Lines are split on '\n' exactly like str.split("\n"), so a trailing 
+    newline produces a final empty line.
+
+    :param f: Open text file (or file-like object).
+
+    :param chunk_bytes: (Optional) Number of characters read at a time.
+
+    :return: Generator of lines without the newline character.
+    """
+    tail = ""
+    while True:
+        chunk = f.read(chunk_bytes)
+        if not chunk:
+            break
+        lines = (tail + chunk).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line
+    yield tail
+
+def iter_line_batches(f, batch_size=DEFAULT_BATCH_SIZE, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Group the lines of an open text file into batches, see iter_lines().
+
+    :return: Generator of (first_line, lines) tuples, where first_line is the
+             0-based line number of lines[0].
+    """
+    first_line = 0
+    lines = []
+    for line in iter_lines(f, chunk_bytes):
+        lines.append(line)
+        if len(lines) == batch_size:
+            yield first_line, lines
+            first_line += len(lines)
+            lines = []
+    if len(lines) > 0:
+        yield first_line, lines
+
+def sort_lines(lines, normalize=None, first_line=0):
+    """Sort raw draft lines, reporting and skipping malformed ones.
+
+    :param lines: List of raw draft strings, one draft per line.
+
+    :param normalize: (Optional) NameNormalizer applied to each line first.
+
+    :param first_line: (Optional) Line number of lines[0], for reporting.
+
+    :return: List of sorted drafts, see sort_draft().
+    """
+    sorted_drafts = []
+    for num, line in enumerate(lines, first_line):
+        if normalize is not None:
+            line = normalize(line)
+        try:
+            sorted_drafts.append(sort_draft(line.split(",")))
+        except ValueError as e:
+            print("Skipping malformed draft on line " + str(num + 1) + ": " + str(e))
+    return sorted_drafts
+
+def _sort_lines_job(job):
+    """Process pool entry point for sort_lines()."""
+    first_line, lines, normalize = job
+    return sort_lines(lines, normalize, first_line)
+
+def _encode_lines_job(job):
+    """Process pool entry point encoding non-empty drafts of sort_lines()."""
+    first_line, lines, normalize, le, pack_size = job
+    drafts = [d for d in sort_lines(lines, normalize, first_line) if len(d) > 0]
+    if len(drafts) == 0:
+        return None
+    return drafts_to_tensor(drafts, le, pack_size)
+
+def map_jobs(func, jobs, n_jobs=1):
+    """Map func over jobs, in order, with a pool of n_jobs processes.
+
+    At most 2*n_jobs jobs are in flight: jobs are read from the iterable only as
+    results are consumed, so a generator of chunks is never loaded all at once.
+
+    :return: Generator of results, in the same order as jobs.
+    """
+    if n_jobs <= 1:
+        for job in jobs:
+            yield func(job)
+    else:
+        jobs = iter(jobs)
+        with multiprocessing.Pool(n_jobs) as pool:
+            pending = deque(pool.apply_async(func, (job,)) for job in itertools.islice(jobs, 2*n_jobs))
+            while pending:
+                result = pending.popleft().get()
+                pending.extend(pool.apply_async(func, (job,)) for job in itertools.islice(jobs, 1))
+                yield result
+
+def _line_jobs(draft_path, extra, chunk_bytes, print_every):
+    """Yield (first_line, lines) + extra jobs for the lines of a draft file."""
+    if hasattr(draft_path, "read"):
+        f = draft_path
+    else:
+        f = open(draft_path)
+    try:
+        for first_line, lines in iter_line_batches(f, chunk_bytes=chunk_bytes):
+            if print_every:
+                for num in range(first_line, first_line + len(lines)):
+                    if num % print_every == 0:
+                        print("Processing draft: " + str(num) + ".")
+            yield (first_line, lines) + extra
+    finally:
+        if f is not draft_path:
+            f.close()
+
+def iter_drafts(draft_path, set_var=None, chunk_bytes=DEFAULT_CHUNK_BYTES, 
+                print_every=None, n_jobs=1):
+    """Stream sorted drafts from a draft csv file, one draft at a time.
+
+    The file is read incrementally, so peak memory tracks a single chunk 
+    instead of the whole file. 
+
+    :param draft_path: Path to draft csv data file from database, or an open
+                       text file.
+
+    :param set_var: (Optional) Set variable with the original cardnames. If
+                    provided, each line is cleaned as in fix_commas(). 
+
+    :param chunk_bytes: (Optional) Number of characters read at a time.
+
+    :param print_every: (Optional) Print an update every this many drafts.
+
+    :param n_jobs: (Optional) Number of processes sorting batches of lines. 
+                   Drafts are yielded in file order regardless.
+
+    :return: Generator of sorted drafts, see sort_draft().
+    """
+    normalize = None
+    if set_var is not None:
+        normalize = NameNormalizer(set_var["Name"])
+
+    jobs = _line_jobs(draft_path, (normalize,), chunk_bytes, print_every)
+    for sorted_drafts in map_jobs(_sort_lines_job, jobs, n_jobs):
+        for sorted_draft in sorted_drafts:
+            yield sorted_draft
+
+def encode_drafts(draft_path, le, set_var=None, pack_size=15, 
+                  chunk_bytes=DEFAULT_CHUNK_BYTES, print_every=None, n_jobs=1):
+    """Stream a draft csv file straight into a drafts tensor.
+
+    Equivalent to drafts_to_tensor() over the non-empty drafts of 
+    iter_drafts(), but each batch of lines is sorted and encoded to int16 
+    inside a worker process, so no cardname lists reach the parent.
+
+    :param draft_path: Path to draft csv data file from database, or an open
+                       text file.
+
+    :param le: Label encoder for cardnames.
+
+    :param set_var: (Optional) Set variable with the original cardnames, see
+                    iter_drafts().
+
+    :param pack_size: (Optional) Number of cards in a pack.
+
+    :param chunk_bytes: (Optional) Number of characters read at a time.
+
+    :param print_every: (Optional) Print an update every this many drafts.
+
+    :param n_jobs: (Optional) Number of worker processes.
+
+    :return: Drafts tensor of shape (num_drafts, 45, 15).
+    """
+    normalize = None
+    if set_var is not None:
+        normalize = NameNormalizer(set_var["Name"])
+
+    jobs = _line_jobs(draft_path, (normalize, le, pack_size), chunk_bytes, print_every)
+    tensors = [t for t in map_jobs(_encode_lines_job, jobs, n_jobs) if t is not None]
+    if len(tensors) == 0:
+        return np.int16([])
+    return np.concatenate(tensors)
+
+def process_drafts(drafts, print_every=10000, n_jobs=1):
     """Process a raw multi-draft string into a list of sorted drafts.
 
     :param drafts: Raw string from draft database containing multiple drafts.
 
     :param print_every: (Optional) Print an update every this many drafts.
 
+    :param n_jobs: (Optional) Number of worker processes.
+
     :return: List of sorted drafts.
     """
- 
-    #Store each draft as a string.
-    string_drafts = drafts.split("\n")
-    
-    #Store each draft as an unsorted list.
-    unsorted_drafts = []
-    for d in string_drafts:
-        unsorted_drafts.append(d.split(","))
-        
-    #Create pick lists when possible.
-    sorted_drafts = []
-    for num, u in enumerate(unsorted_drafts):
-        if num % print_every == 0:
-            print("Processing draft: " + str(num) + ".")
-        try:
-            sorted_drafts.append(sort_draft(u))
-        except:
-            pass
-    return sorted_drafts
+    return list(iter_drafts(io.StringIO(drafts), print_every=print_every, n_jobs=n_jobs))
 
 def create_rating_dict(set_df):
     """Creates a rating dictionary for efficient rating updates. 
@@ -283,12 +548,94 @@ def draft_to_matrix(cur_draft, le, pack_size=15):
     pick_matrix = np.int16(pick_list) #, device=device) Use default device. 
     return pick_matrix
 
-def drafts_to_tensor(drafts, le, pack_size=15):
-    """Create tensor of shape (num_drafts, 45, 15)."""
-    pick_tensor_list = [draft_to_matrix(d, le) for d in drafts]
+def _drafts_to_tensor_job(job):
+    """Process pool entry point for drafts_to_tensor()."""
+    drafts, le, pack_size = job
+    return drafts_to_tensor(drafts, le, pack_size)
+
+def drafts_to_tensor(drafts, le, pack_size=15, n_jobs=1):
+    """Create tensor of shape (num_drafts, 45, 15).
+
+    With n_jobs > 1, contiguous shards of drafts are encoded in a process 
+    pool and concatenated in order. The result is identical to n_jobs=1.
+    """
+    if n_jobs > 1:
+        drafts = list(drafts)
+        shard_size = max(1, min(DEFAULT_BATCH_SIZE, -(-len(drafts) // n_jobs)))
+        jobs = ((drafts[i:i+shard_size], le, pack_size) 
+                for i in range(0, len(drafts), shard_size))
+        tensors = list(map_jobs(_drafts_to_tensor_job, jobs, n_jobs))
+        if len(tensors) > 0:
+            return np.concatenate(tensors)
+    pick_tensor_list = [draft_to_matrix(d, le, pack_size) for d in drafts]
     pick_tensor = np.int16(pick_tensor_list) #, device=device) Use default device.
     return pick_tensor
 
+def save_draft_store(path, drafts_tensor, le):
+    """Write a drafts tensor to a memory-mappable draft store.
+
+    A draft store is a pair of files: 
+      path.bin  - raw int16 drafts tensor in C order
+      path.json - header with the format version, tensor shape, pack size, 
+                  draft count and label encoder classes
+
+    :param path: Path of the store, without extension.
+
+    :param drafts_tensor: Drafts tensor of shape (num_drafts, 45, 15).
+
+    :param le: Label encoder used to create the drafts tensor.
+    """
+    drafts_tensor = np.ascontiguousarray(drafts_tensor, dtype=np.int16)
+    header = {
+        "version": DRAFT_STORE_VERSION,
+        "dtype": "int16",
+        "shape": list(drafts_tensor.shape),
+        "n_drafts": int(drafts_tensor.shape[0]),
+        "pack_size": int(drafts_tensor.shape[2]),
+        "classes": [str(c) for c in le.classes_],
+    }
+    drafts_tensor.tofile(path + ".bin")
+    with open(path + ".json", "w") as f:
+        json.dump(header, f)
+
+def read_draft_store_header(path):
+    """Return the header of a draft store, see save_draft_store()."""
+    with open(path + ".json") as f:
+        header = json.load(f)
+    if header.get("version") != DRAFT_STORE_VERSION:
+        raise ValueError("Unsupported draft store version " + str(header.get("version")) + 
+                         " in " + path + ".json, expected " + str(DRAFT_STORE_VERSION) + ".")
+    return header
+
+def open_draft_store(path):
+    """Open a draft store without reading it into memory.
+
+    Pages of the drafts tensor are loaded on demand, so opening is instant
+    regardless of the number of drafts.
+
+    :param path: Path of the store, without extension.
+
+    :return: Read-only np.memmap drafts tensor and its label encoder.
+    """
+    header = read_draft_store_header(path)
+    drafts_tensor = np.memmap(path + ".bin", dtype=header["dtype"], mode="r", 
+                              shape=tuple(header["shape"]))
+    le = create_le(header["classes"])
+    return drafts_tensor, le
+
+def convert_pickle_to_store(pickle_path, path, le):
+    """Convert a pickled drafts tensor into a draft store.
+
+    :param pickle_path: Path to a pickled drafts tensor.
+
+    :param path: Path of the new store, without extension.
+
+    :param le: Label encoder used to create the drafts tensor.
+    """
+    with open(pickle_path, "rb") as f:
+        drafts_tensor = pickle.load(f)
+    save_draft_store(path, drafts_tensor, le)
+
 def collection_pack_to_x(collection, pack, le):
     """Generate x, input, as a row vector.
     0:n     : collection vector
@@ -326,14 +673,33 @@ def collection_pack_to_x(collection, pack, le):
 class DraftDataset(Dataset):
     """Defines a draft dataset in PyTorch."""
     
-    def __init__(self, drafts_tensor, le):
+    def __init__(self, drafts_tensor, le, draft_indices=None):
         """Initialization.
+
+        :param drafts_tensor: Drafts tensor of shape (num_drafts, 45, 15).
+
+        :param le: Label encoder used to create the drafts tensor.
+
+        :param draft_indices: (Optional) Drafts of drafts_tensor to use, in
+                              order. Defaults to all drafts. This makes the
+                              dataset a view, without copying drafts_tensor.
         """
         self.drafts_tensor = drafts_tensor
         self.le = le
+        self.draft_indices = draft_indices
         self.cards_in_set = len(self.le.classes_)
         self.pack_size = int(self.drafts_tensor.shape[1]/3)
         self.draft_size = self.pack_size*3
+
+    @classmethod
+    def from_store(cls, path):
+        """Create a dataset backed by a memory-mapped draft store.
+
+        :param path: Path of the store, without extension, see 
+                     save_draft_store().
+        """
+        drafts_tensor, le = open_draft_store(path)
+        return cls(drafts_tensor, le)
         
     def __getitem__(self, index):
         """Return a training example.
@@ -341,6 +707,8 @@ class DraftDataset(Dataset):
         #Grab information on current draft.
         pick_num = index % self.draft_size #0-self.pack_size*3-1
         draft_num = int((index - pick_num)/self.draft_size)
+        if self.draft_indices is not None:
+            draft_num = self.draft_indices[draft_num]
         
         #Generate.
         x = self.create_new_x(pick_num, draft_num)
@@ -354,19 +722,19 @@ class DraftDataset(Dataset):
         n:2n    : pack vector
                   0 -> card not in pack
                   1 -> card in pack
-        Efficiency optimization possible. Iterative adds to numpy array.
+        Both halves are filled with single numpy calls, without Python loops.
         """
         #Initialize collection / cards in pack vector.
         x = np.zeros([self.cards_in_set * 2], dtype = "int16")
         
         #Fill in collection vector excluding current pick (first half).
-        for n in self.drafts_tensor[draft_num, :pick_num, 0]:
-            x[n] += 1
+        collection = self.drafts_tensor[draft_num, :pick_num, 0].astype(np.intp)
+        x[:self.cards_in_set] = np.bincount(collection, minlength=self.cards_in_set)
             
         #Fill in pack vector.
         cards_in_pack =  self.pack_size - pick_num%self.pack_size #Cards in current pack.
-        for n in self.drafts_tensor[draft_num, pick_num, :cards_in_pack]:
-            x[n + self.cards_in_set] = 1
+        pack = self.drafts_tensor[draft_num, pick_num, :cards_in_pack].astype(np.intp)
+        x[pack + self.cards_in_set] = 1
             
         #Convert to Torch tensor.
         x = torch.Tensor(x)
@@ -387,30 +755,214 @@ class DraftDataset(Dataset):
         y = torch.tensor(y, dtype=torch.int64) # , device=device) # Use default.
         return y
     
+    def get_batch(self, indices):
+        """Return a whole minibatch of training examples.
+
+        Equivalent to stacking self[i] for i in indices, except that y holds
+        class indices instead of one hot rows. All collection counts are 
+        scatter-added with a single bincount over the flattened batch.
+
+        :param indices: Sequence of example indices.
+
+        :return: Tuple of a float tensor x of shape (B, 2*n) and an int64 
+                 tensor y of shape (B,) with the picked card of each example.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        batch_size = len(indices)
+        row_size = self.cards_in_set * 2
+        rows = np.arange(batch_size)[:, None] * row_size
+
+        #Grab information on current drafts.
+        pick_num = indices % self.draft_size
+        draft_num = indices // self.draft_size
+        if self.draft_indices is not None:
+            draft_num = np.asarray(self.draft_indices)[draft_num]
+        picks = np.asarray(self.drafts_tensor[draft_num, :, 0], dtype=np.intp)
+        packs = np.asarray(self.drafts_tensor[draft_num, pick_num, :], dtype=np.intp)
+
+        #Fill in collection vectors excluding current picks (first half).
+        in_collection = np.arange(self.draft_size) < pick_num[:, None]
+        x = np.bincount((rows + picks)[in_collection], minlength=batch_size * row_size)
+        x = x.astype(np.float32)
+
+        #Fill in pack vectors.
+        cards_in_pack = self.pack_size - pick_num%self.pack_size #Cards in current packs.
+        in_pack = np.arange(self.pack_size) < cards_in_pack[:, None]
+        x[(rows + packs + self.cards_in_set)[in_pack]] = 1
+
+        #Picked cards are the first card of each pack.
+        x = torch.from_numpy(x.reshape(batch_size, row_size))
+        y = torch.from_numpy(packs[:, 0].astype(np.int64))
+        return x, y
+    
+    def get_sparse_batch(self, indices):
+        """Return a whole minibatch of training examples as card index lists.
+
+        Input for SparseDraftNet. Index lists are padded with n, the number 
+        of cards in set, and repeated collection cards are repeated indices.
+
+        :param indices: Sequence of example indices.
+
+        :return: Tuple ((collection, pack), y) of int64 tensors. collection is
+                 of shape (B, 3*ps-1), pack of shape (B, ps) and y of shape 
+                 (B,) with the picked card of each example.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+
+        #Grab information on current drafts.
+        pick_num = indices % self.draft_size
+        draft_num = indices // self.draft_size
+        if self.draft_indices is not None:
+            draft_num = np.asarray(self.draft_indices)[draft_num]
+        picks = np.asarray(self.drafts_tensor[draft_num, :-1, 0], dtype=np.int64)
+        packs = np.asarray(self.drafts_tensor[draft_num, pick_num, :], dtype=np.int64)
+
+        #Pad collections past the current pick and packs past their last card.
+        in_collection = np.arange(self.draft_size - 1) < pick_num[:, None]
+        cards_in_pack = self.pack_size - pick_num%self.pack_size #Cards in current packs.
+        in_pack = np.arange(self.pack_size) < cards_in_pack[:, None]
+        collection = np.where(in_collection, picks, self.cards_in_set)
+        pack = np.where(in_pack, packs, self.cards_in_set)
+
+        x = (torch.from_numpy(collection), torch.from_numpy(pack))
+        y = torch.from_numpy(packs[:, 0].copy())
+        return x, y
+    
     def __len__(self):
+        if self.draft_indices is not None:
+            return len(self.draft_indices) * self.draft_size
         return len(self.drafts_tensor) * self.draft_size
 
-def load_dataset(rating_path1, rating_path2, drafts_path):
+class DraftBatchDataset(Dataset):
+    """Wraps a DraftDataset so that it is indexed by whole minibatches.
+
+    dataset[indices] returns DraftDataset.get_batch(indices), so a DataLoader
+    built by create_batch_loader() makes one numpy call per minibatch instead
+    of one __getitem__ call per example followed by collation.
+    """
+
+    def __init__(self, dataset, sparse=False):
+        """Initialization.
+
+        :param dataset: DraftDataset to wrap.
+
+        :param sparse: (Optional) If true, return card index lists, see 
+                       DraftDataset.get_sparse_batch().
+        """
+        self.dataset = dataset
+        self.sparse = sparse
+
+    def __getitem__(self, indices):
+        if self.sparse:
+            return self.dataset.get_sparse_batch(indices)
+        return self.dataset.get_batch(indices)
+
+    def __len__(self):
+        return len(self.dataset)
+
+def create_batch_loader(dataset, batch_size=100, shuffle=False, sparse=False):
+    """Create a DataLoader yielding (x, y) minibatches of a DraftDataset.
+
+    y holds class indices, see DraftDataset.get_batch().
+
+    :param dataset: DraftDataset to load from.
+
+    :param batch_size: (Optional) Number of examples per minibatch.
+
+    :param shuffle: (Optional) If true, reshuffle examples every epoch.
+
+    :param sparse: (Optional) If true, x is a tuple of card index lists for
+                   SparseDraftNet, see DraftDataset.get_sparse_batch().
+
+    :return: torch.utils.data.DataLoader.
+    """
+    if shuffle:
+        sampler = RandomSampler(dataset)
+    else:
+        sampler = SequentialSampler(dataset)
+    batch_sampler = BatchSampler(sampler, batch_size, drop_last=False)
+    return DataLoader(DraftBatchDataset(dataset, sparse), sampler=batch_sampler, batch_size=None)
+
+class KFoldDrafts(object):
+    """K-fold cross-validation splits of a single drafts tensor.
+
+    Every split is a pair of DraftDataset views defined by index arrays, so 
+    drafts are encoded and stored once regardless of k:
+        cv = KFoldDrafts(drafts_tensor, le, k=3)
+        for train_dataset, val_dataset in cv:
+            ...
+
+    Contiguous folds match splitting a list of drafts into k parts, the last
+    part taking the remainder.
+    """
+
+    def __init__(self, drafts_tensor, le, k=3, shuffle=False, seed=None):
+        """Create the folds.
+
+        :param drafts_tensor: Drafts tensor of shape (num_drafts, 45, 15).
+
+        :param le: Label encoder used to create the drafts tensor.
+
+        :param k: (Optional) Number of folds.
+
+        :param shuffle: (Optional) If true, assign drafts to folds at random.
+                        Otherwise folds are contiguous.
+
+        :param seed: (Optional) Random seed used when shuffle is true.
+        """
+        n_drafts = len(drafts_tensor)
+        if not 1 < k <= n_drafts:
+            raise ValueError("Expected 1 < k <= " + str(n_drafts) + ", got " + str(k) + ".")
+        self.drafts_tensor = drafts_tensor
+        self.le = le
+        self.k = k
+
+        #Fold boundaries, with the remainder in the last fold.
+        order = np.arange(n_drafts)
+        if shuffle:
+            order = np.random.RandomState(seed).permutation(n_drafts)
+        fold_size = n_drafts // k
+        bounds = [i*fold_size for i in range(k)] + [n_drafts]
+        
+        #Sorted indices keep reads from a memory-mapped tensor sequential.
+        self.folds = [np.sort(order[bounds[i]:bounds[i+1]]) for i in range(k)]
+
+    @classmethod
+    def from_store(cls, path, k=3, shuffle=False, seed=None):
+        """Create folds over a memory-mapped draft store, see open_draft_store()."""
+        drafts_tensor, le = open_draft_store(path)
+        return cls(drafts_tensor, le, k, shuffle, seed)
+
+    def split(self, i):
+        """Return (train, validation) DraftDatasets with fold i held out."""
+        train_indices = np.concatenate([f for j, f in enumerate(self.folds) if j != i])
+        train_dataset = DraftDataset(self.drafts_tensor, self.le, train_indices)
+        val_dataset = DraftDataset(self.drafts_tensor, self.le, self.folds[i])
+        return train_dataset, val_dataset
+
+    def __getitem__(self, i):
+        return self.split(i)
+
+    def __len__(self):
+        return self.k
+
+    def __iter__(self):
+        for i in range(self.k):
+            yield self.split(i)
+
+def load_dataset(rating_path1, rating_path2, drafts_path, n_jobs=1):
     """Create drafts tensor from drafts and set files."""
     # Load the set. inputs
-    cur_set = create_set(rating_path1, rating_path2)
-    raw_drafts = load_drafts(drafts_path)
+    raw_set = create_set(rating_path1, rating_path2)
     
     # Fix commas. 
-    cur_set, raw_drafts = fix_commas(cur_set, raw_drafts)
-    
-    # Process drafts. 
-    drafts = process_drafts(raw_drafts)
-    
-    # Drop empty elements at end, if present. 
-    while len(drafts[-1]) == 0:
-        drafts = drafts[:-1]
+    cur_set = fix_set_names(raw_set)
     
     # Create a label encoder.
     le = create_le(cur_set["Name"].values)
     
-    # Create drafts tensor. 
-    drafts_tensor = drafts_to_tensor(drafts, le)
+    # Stream drafts straight into the drafts tensor, dropping empty lines. 
+    drafts_tensor = encode_drafts(drafts_path, le, raw_set, print_every=10000, n_jobs=n_jobs)
     
     # Create a dataset.
     cur_dataset = DraftDataset(drafts_tensor, le)
@@ -75,6 +75,13 @@ class DraftNet(nn.Module):
             collection = collection_and_features
         
         y = self.linear1(collection)
+        y = self.forward_hidden(y)
+        
+        y = y * pack # Enforce cards in pack only.        
+        return y
+
+    def forward_hidden(self, y):
+        """Apply all layers after linear1."""
         y = self.bn1(y)
         y = self.relu1(y)
         y = self.dropout1(y)
@@ -90,8 +97,6 @@ class DraftNet(nn.Module):
         y = self.dropout3(y)
 
         y = self.linear4(y)
-        
-        y = y * pack # Enforce cards in pack only.        
         return y
         
     def __getitem__(self, index):
@@ -147,4 +152,59 @@ class DraftNet(nn.Module):
         return y
     
     def __len__(self):
-        return len(self.drafts_tensor) * self.draft_size
\ No newline at end of file
+        return len(self.drafts_tensor) * self.draft_size
+
+class SparseDraftNet(DraftNet):
+    
+    def __init__(self, set_tensor, use_features = False):
+        """DraftNet taking padded card index lists instead of dense x vectors.
+        
+        Input is a tuple (collection, pack) of int64 tensors of shape (B, L)
+        holding card indices, padded with ss (the number of cards in set), 
+        see DraftDataset.get_sparse_batch(). At most 45 of the 2*ss dense 
+        inputs are ever non-zero, so linear1 is computed as an 
+        nn.EmbeddingBag(mode='sum') over the collection indices plus a bias,
+        which is mathematically equivalent to the dense layer. 
+        
+        Use SparseDraftNet.from_dense() to convert a trained DraftNet.
+        
+        param set_tensor: Mxss set tensor describing the set
+        """
+        if use_features:
+            raise ValueError("SparseDraftNet does not support use_features.")
+        super(SparseDraftNet, self).__init__(set_tensor, use_features = False)
+        
+        # Replace linear1 by an embedding bag, with a zero padding row.
+        size1 = self.linear1.out_features
+        self.embedding1 = nn.EmbeddingBag(self.ss + 1, size1, mode = 'sum', padding_idx = self.ss)
+        self.bias1 = nn.Parameter(torch.zeros(size1))
+        with torch.no_grad():
+            self.embedding1.weight[:self.ss] = self.linear1.weight.t()
+            self.embedding1.weight[self.ss] = 0
+            self.bias1.copy_(self.linear1.bias)
+        del self.linear1
+        
+    @classmethod
+    def from_dense(cls, net):
+        """Return a SparseDraftNet with the weights of a trained DraftNet."""
+        sparse_net = cls(net.set_tensor)
+        state = net.state_dict()
+        weight = state.pop('linear1.weight')
+        state['bias1'] = state.pop('linear1.bias')
+        state['embedding1.weight'] = torch.cat((weight.t(), torch.zeros(1, weight.shape[0])), 0)
+        sparse_net.load_state_dict(state)
+        sparse_net.train(net.training)
+        return sparse_net
+        
+    def forward(self, x):
+        
+        collection, pack = x
+        
+        y = self.embedding1(collection) + self.bias1
+        y = self.forward_hidden(y)
+        
+        # Enforce cards in pack only, the padding column is dropped.
+        pack_mask = torch.zeros(len(pack), self.ss + 1, device = y.device, dtype = y.dtype)
+        pack_mask.scatter_(1, pack, 1)
+        y = y * pack_mask[:, :self.ss]
+        return y
@@ -1,28 +1,36 @@
 # Wrapper class for any neural-network bot
 
+import numpy as np
+import torch
+
 from .bot import *
-from .load import collection_pack_to_x
+from .nnet_architecture import SparseDraftNet
 
 class NeuralNetBot(Bot):
-    
+
     def __init__(self, net, le):
         self.num_correct = 0
         self.num_total = 0
         self.net = net # Pre-trained neural net that ranks cards from one-hot encoded [collection, pack] vector
         self.le = le   # Pre-trained label-encoder mapping card names to numeric class labels
-        
+        self.net.eval() # Inference only: no dropout, batch-norm uses running statistics
+
+        # Cached label-encoder lookups, instead of le.transform / le.inverse_transform per card
+        self.classes = [str(c) for c in self.le.classes_]
+        self.card_index = {c: i for i, c in enumerate(self.classes)}
+
     def rank_pack(self, draft_frame):
         """
-        INPUT: one draft frame in form [pack, collection], where the human pick is the first 
+        INPUT: one draft frame in form [pack, collection], where the human pick is the first
                card name in the pack
         OUTPUT: ranked list of pick preferences. E.g. for the pack ["cardA", "cardB", "cardC"], could
                 return ["cardB":1, "cardA":0.2, "cardC":0] in decreasing order of preference
         NOTE: use list not tuple or dict for input
-    
+
         This method is to be called by the testing script. Modify the get_choice method
         with the drafting logic of your bot's subclass.
         """
-        pack_rank = self.__get_ranking(draft_frame)
+        pack_rank = self.rank_frames([draft_frame])[0]
         top_pick = self.get_top_pick(pack_rank)
 
         self.num_total += 1
@@ -31,26 +39,65 @@ class NeuralNetBot(Bot):
             self.num_correct += 1
 
         return pack_rank
-        
-    def __get_ranking(self, draft_frame):
+
+    def rank_frames(self, draft_frames):
         """
-        INPUT: one draft frame in form [pack, collection], where the human pick is the first 
-               card name in the pack
-        OUTPUT: list of pick preferences in same order as input. E.g. for the pack 
-                ["cardA", "cardB", "cardC"], could return ["cardA":0.2, "cardB":1, "cardC":0]
-    
-        Picks the rarest on-color card in each pack.
-        """
-        
-        # Initializes pack ranking and separates pack from collection
-        pack = draft_frame[0]
-        collection = draft_frame[1]
-
-        # Maps card names to one-hot encoding and gets nnet ranking
-        x = collection_pack_to_x(collection, pack, self.le)
-        pred = self.net(x)
-        
-        # Maps predictions to card names
-        pack_rank = {str(self.le.inverse_transform([i])[0]) : float(v.detach().numpy()) for i, v in enumerate(pred[0,:]) if v > 0}
-        
-        return pack_rank
\ No newline at end of file
+        INPUT: list of draft frames in form [pack, collection]
+        OUTPUT: list of pick preferences, one per frame, as returned by rank_pack. Cards the net
+                does not score above 0 are left out, as in rank_pack.
+
+        All frames are encoded into one tensor and scored with one gradient-free forward pass.
+        """
+
+        # Maps card names to class labels
+        packs = pad_card_ids([[self.card_index[card] for card in frame[0]] for frame in draft_frames])
+        collections = pad_card_ids([[self.card_index[card] for card in frame[1]] for frame in draft_frames])
+
+        # Gets nnet ranking for all frames at once
+        scores = self.rank_packs(packs, collections)
+
+        # Maps scores of cards in each pack to card names, in class label order
+        pack_ranks = []
+        for i in range(len(draft_frames)):
+            pack, first = np.unique(packs[i, :len(draft_frames[i][0])], return_index=True)
+            pack_ranks.append({self.classes[c] : float(v) for c, v in zip(pack, scores[i, first]) if v > 0})
+        return pack_ranks
+
+    def rank_packs(self, packs, collections):
+        """
+        Batched ranking, see Bot.rank_packs. Card ids are class labels of self.le. Cards the net
+        does not score above 0 get -inf, as they are left out by rank_pack.
+        """
+        packs = np.asarray(packs, dtype=np.intp)
+        x = self.encode(packs, collections)
+        with torch.inference_mode():
+            pred = self.net(x).cpu().numpy()
+        scores = np.take_along_axis(pred, np.where(packs >= 0, packs, 0), axis=1).astype(float)
+        scores[(packs < 0) | ~(scores > 0)] = -np.inf
+        return scores
+
+    def encode(self, packs, collections):
+        """
+        Encodes padded arrays of class labels (see Bot.rank_packs) into network input, see 
+        collection_pack_to_x. SparseDraftNet gets index arrays padded with n instead of dense
+        vectors; its pack mask is 0/1, as in training, while the dense pack vector counts
+        repeated cards.
+        """
+        n = len(self.classes)
+        device = next(self.net.parameters()).device
+        packs = np.asarray(packs, dtype=np.int64)
+        collections = np.asarray(collections, dtype=np.int64).reshape(len(packs), -1)
+
+        if isinstance(self.net, SparseDraftNet):
+            if collections.shape[1] == 0:
+                collections = np.full([len(packs), 1], -1, dtype=np.int64)
+            collection_x = np.where(collections >= 0, collections, n)
+            pack_x = np.where(packs >= 0, packs, n)
+            return (torch.from_numpy(collection_x).to(device), torch.from_numpy(pack_x).to(device))
+
+        # Collection counts in 0:n, pack counts in n:2n, for every frame
+        rows = np.arange(len(packs))[:, None]*2*n
+        flat = np.concatenate([(rows + collections)[collections >= 0], (rows + n + packs)[packs >= 0]])
+        x = np.bincount(flat.astype(np.intp), minlength=len(packs)*2*n)
+        x = torch.from_numpy(x.reshape(len(packs), 2*n).astype(np.float32))
+        return x.to(device)
@@ -4,11 +4,24 @@ import numpy as np
 
 # --- Naive bot (drafts like a 5-years-old)
 class RaredraftBot(Bot):
+
+    #Class CONSTANTS
+    COLORS = ['W', 'U', 'B', 'R', 'G']
+    RARITY_BONUS = {'M': 10, 'R': 5, 'U': 2}
+    ON_COLOR_BONUS = 1
     
-    def __init__(self, card_set):
+    def __init__(self, card_set, rng=None):
         self.num_correct = 0
         self.num_total = 0
         self.card_set = card_set # a list with 'Name' column, containing card names and attributes
+        self.rng = rng # np.random.Generator for reproducible tie-breaks, None for the global np.random state
+
+        # Per-card lookup arrays, indexed by row of card_set
+        costs = [str(cost) for cost in card_set["Casting Cost 1"]]
+        self.card_index = {name: i for i, name in enumerate(card_set["Name"])}
+        self.rarity_bonus = np.array([self.RARITY_BONUS.get(str(rarity)[:1], 0) for rarity in card_set["Rarity"]])
+        self.color_counts = np.array([[cost.count(c) for c in self.COLORS] for cost in costs]) # mana symbols
+        self.on_color = np.array([[c in cost for c in self.COLORS] for cost in costs])         # any symbol
         
     def rank_pack(self, draft_frame):
         """
@@ -41,37 +54,37 @@ class RaredraftBot(Bot):
         Picks the rarest on-color card in each pack.
         """
         
-        # Initializes pack ranking and separates pack from collection
-        r = np.random.uniform(low=0, high=0.9, size=len(draft_frame[0]))
-        pack_rank = {draft_frame[0][i]:r[i] for i in range(len(draft_frame[0]))}
+        # Initializes pack ranking with random tie-breaks and separates pack from collection
         pack = draft_frame[0]
         collection = draft_frame[1]
+        rng = np.random if self.rng is None else self.rng
+        scores = rng.uniform(low=0, high=0.9, size=len(pack))
         
-        # Gets current color 
-        color_stats = {'W':0, 'U':0, 'B':0, 'R':0, 'G':0}
-        if (len(collection) > 0):
-            collection_colors = self.card_set[self.card_set["Name"].isin(collection)]["Casting Cost 1"]
-            collection_colors = list(color for color in collection_colors)
-            for card_colors in collection_colors:
-                for color in card_colors:
-                    if color in color_stats:
-                        color_stats[color] += 1
-        current_color = max(color_stats, key = color_stats.get) 
+        # Gets current color, each set card counts once
+        if self.is_tracking(collection):
+            color_stats = self.draft_color_stats
+        else:
+            collection_cards = np.unique([self.card_index[card] for card in collection if card in self.card_index])
+            color_stats = self.color_counts[collection_cards.astype(int)].sum(axis=0)
+        current_color = np.argmax(color_stats) # First of WUBRG on ties
         
-        # Makes the pick based on rarity
-        pack_rarity = self.card_set[self.card_set["Name"].isin(pack)]
-        mythics = pack_rarity["Name"][pack_rarity.Rarity.str[0] == 'M'] # mythics
-        for card in mythics:
-            pack_rank[card] += 10
-        rares = pack_rarity["Name"][pack_rarity.Rarity.str[0] == 'R'] # rares
-        for card in rares:
-            pack_rank[card] += 5
-        uncommons = pack_rarity["Name"][pack_rarity.Rarity.str[0] == 'U'] # uncommons
-        for card in uncommons:
-            pack_rank[card] += 2
-        on_color = list(current_color in color for color in pack_rarity["Casting Cost 1"]) # on-color bonus
-        on_color = pack_rarity[on_color]["Name"]
-        for card in on_color:
-            pack_rank[card] += 1
+        # Makes the pick based on rarity, with an on-color bonus
+        in_set = [i for i, card in enumerate(pack) if card in self.card_index]
+        pack_cards = [self.card_index[pack[i]] for i in in_set]
+        scores[in_set] += self.rarity_bonus[pack_cards]
+        scores[in_set] += self.ON_COLOR_BONUS*self.on_color[pack_cards, current_color]
         
-        return pack_rank
\ No newline at end of file
+        # Repeated cards keep the score of their last copy
+        pack_rank = {pack[i]:scores[i] for i in range(len(pack))}
+        return pack_rank
+
+    def begin_draft(self):
+        super(RaredraftBot, self).begin_draft()
+        self.draft_color_stats = np.zeros(len(self.COLORS), dtype=int) # Running color_stats of the collection
+        self.draft_cards = set() # Each set card counts once, as with isin(collection)
+
+    def observe_pick(self, card):
+        super(RaredraftBot, self).observe_pick(card)
+        if card in self.card_index and card not in self.draft_cards:
+            self.draft_cards.add(card)
+            self.draft_color_stats = self.draft_color_stats + self.color_counts[self.card_index[card]]
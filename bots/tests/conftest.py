@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import draftsimtools from the bots directory, as the notebooks and scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,37 @@
+# Checks the BayesBot count matrices against the notebook's per-pick loop
+
+import numpy as np
+
+import draftsimtools as ds
+
+def count_loop(drafts_tensor, n_cards):
+    """bayesbot_preprocessor.ipynb before build_cooccurrence: four outer products per pick."""
+    num_drafts, draft_size, pack_size = drafts_tensor.shape
+    counts = ds.empty_cooccurrence(n_cards)
+    for draft in drafts_tensor:
+        collection = np.zeros(n_cards, dtype=np.int64)
+        for pick_num in range(draft_size):
+            cards_in_pack = pack_size - pick_num % pack_size
+            pick = np.bincount([draft[pick_num, 0]], minlength=n_cards)
+            pack = np.bincount(draft[pick_num, :cards_in_pack], minlength=n_cards)
+            counts["nChoice"] += np.outer(pick, pack)
+            counts["dChoice"] += np.outer(pack, pack)
+            counts["nCoDraft"] += np.outer(pick, collection)
+            counts["dCoDraft"] += np.outer(pack, collection)
+            counts["pFull"] += pick
+            collection += pick
+    return counts
+
+def test_build_cooccurrence_matches_loop():
+    rng = np.random.RandomState(0)
+    n_cards, pack_size = 12, 5
+    drafts_tensor = rng.randint(n_cards, size=(23, 3*pack_size, pack_size)).astype(np.int16)
+    cards_in_pack = pack_size - np.arange(3*pack_size) % pack_size
+    drafts_tensor[:, np.arange(pack_size)[None, :] >= cards_in_pack[:, None]] = 0 # Padding
+
+    expected = count_loop(drafts_tensor, n_cards)
+    counts = ds.build_cooccurrence(drafts_tensor, n_cards, chunk_size=4)
+    assert sorted(counts) == sorted(expected)
+    for name in expected:
+        assert counts[name].dtype == np.int64
+        np.testing.assert_array_equal(counts[name], expected[name], err_msg=name)
@@ -0,0 +1,41 @@
+# Checks ClassicBot.get_color_bias_vector against the per-card reference get_color_bias
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import draftsimtools as ds
+
+RATING_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "bots_data", "nnet_train", "standardized_m19_rating.tsv")
+
+@pytest.fixture(scope="module")
+def bot():
+    m19_set = pd.read_csv(RATING_PATH, delimiter="\t")
+    m19_set["Color Vector"] = [eval(s) for s in m19_set["Color Vector"]]
+    return ds.ClassicBot(m19_set)
+
+def commitments(bot):
+    """Zero, tied, threshold and draft-like color commitments."""
+    threshold = bot.COLOR_COMMIT_THRESHOLD
+    yield np.zeros(5)
+    yield np.full(5, threshold)
+    yield np.array([threshold, threshold, 0, 0, 0])
+    yield np.array([threshold, 0, 0, 0, 0])
+    yield np.array([threshold - 1, 0, 0, 0, 0])
+    yield np.array([1, 1, 1, 1, 1.0])
+    yield np.array([0, 5, 5, 2, 0.0])
+    yield np.array([9, 0, 4, 4, 0.0])
+    rng = np.random.RandomState(0)
+    for n_picks in rng.randint(1, 46, size=200):
+        yield bot.colors[rng.randint(len(bot.colors), size=n_picks)].sum(axis=0)
+
+def test_color_bias_vector_matches_reference(bot):
+    cards = [str(card) for card in bot.le.classes_]
+    pack_indices = [bot.card_index[card] for card in cards]
+    for commitment in commitments(bot):
+        expected = [bot.get_color_bias(card, commitment) for card in cards]
+        np.testing.assert_allclose(bot.get_color_bias_vector(pack_indices, commitment), expected,
+                                   rtol=1e-12, atol=1e-12, err_msg=str(commitment))
@@ -0,0 +1,36 @@
+# Checks draft loading utilities against the loops they replaced
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+import draftsimtools as ds
+
+BOTS_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bots_data")
+
+def clean_drafts_loop(drafts, names):
+    """fix_commas before NameNormalizer: one re.sub per comma cardname. Names are escaped,
+    as NameNormalizer does, where the loop used them as patterns."""
+    drafts = re.sub('"', '', drafts)
+    for name in names:
+        if "," in name:
+            drafts = re.sub(re.escape(name), re.sub(",", "", name), drafts)
+    for s in ds.BASIC_LAND_SUFFIXES:
+        drafts = re.sub(s, "", drafts)
+    return drafts
+
+def test_name_normalizer_matches_loop():
+    names = list(pd.read_csv(os.path.join(BOTS_DATA, "m19_rating.tsv"), delimiter="\t")["Name"])
+    names += ["Forest_1", "Forest_2", "Island_3", "Swamp_4", "Mox_(Ruby)+?,_the_Gem.*"]
+    rng = np.random.RandomState(0)
+    lines = []
+    for draft in range(50):
+        picks = rng.choice(names, size=45)
+        lines.append(",".join('"%s"' % name if "," in name else name for name in picks))
+    drafts = "\n".join(lines)
+
+    assert ds.NameNormalizer(names)(drafts) == clean_drafts_loop(drafts, names)
+    set_var = pd.DataFrame({"Name": names})
+    assert ds.fix_commas(set_var, drafts)[1] == clean_drafts_loop(drafts, names)
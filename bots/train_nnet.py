@@ -25,13 +25,38 @@ from torch.utils.data.dataset import Dataset
 # UTILITY FUNCTIONS
 ######
 
-# Loads pickled data
-def load_data(path):
+# Opens a memory-mapped draft dataset
+def load_data(name, le):
     """
-    Load a pickle file from disk. 
+    Open the draft store data_folder + name as a DraftDataset. 
+    
+    The store is converted from name.pkl on first use. 
+    """
+    path = data_folder + name
+    if not os.path.exists(path + ".json"):
+        print("Converting " + path + ".pkl to a draft store.")
+        ds.convert_pickle_to_store(path + ".pkl", path, le)
+    return ds.DraftDataset.from_store(path)
+
+# Opens cross-validation splits of a memory-mapped draft dataset
+def load_cv_data(name, le, k=3):
     """
-    with open(path, "rb") as f:
-        return pickle.load(f)
+    Open the draft store data_folder + name as KFoldDrafts. 
+    
+    On first use, the store is rebuilt from the validation folds of the old
+    split1_val.pkl, split2_val.pkl and split3_val.pkl files, which hold the 
+    third, second and first thirds of the dataset. 
+    """
+    path = data_folder + name
+    if not os.path.exists(path + ".json"):
+        print("Converting split pickles to the draft store " + path + ".")
+        folds = []
+        for split in [3, 2, 1]:
+            with open(data_folder + "split" + str(split) + "_val.pkl", "rb") as f:
+                folds.append(pickle.load(f))
+        ds.save_draft_store(path, np.concatenate(folds), le)
+        del folds
+    return ds.KFoldDrafts.from_store(path, k=k)
 
 ######
 # PARAMETER SETTING
@@ -43,6 +68,7 @@ data_folder = "../bots/bots_data/nnet_train/"
 # Sets additional parameters
 num_epochs = 20
 use_features = False
+sparse_input = False # Train SparseDraftNet on card index lists instead of dense vectors
 device = torch.device("cpu")
 
 ######
@@ -54,25 +80,15 @@ m19_set = pd.read_csv(data_folder + 'standardized_m19_rating.tsv', delimiter="\t
 m19_set["Color Vector"] = [eval(s) for s in m19_set["Color Vector"]]
 le = ds.create_le(m19_set["Name"].values)
 
-# Loads splits of training and validation data
-split1_train = load_data(data_folder + 'split1_train.pkl')
-split1_train = ds.DraftDataset(split1_train, le)
-split1_val = load_data(data_folder + 'split1_val.pkl')
-split1_val = ds.DraftDataset(split1_val, le)
-split2_train = load_data(data_folder + 'split2_train.pkl')
-split2_train = ds.DraftDataset(split2_train, le)
-split2_val = load_data(data_folder + 'split2_val.pkl')
-split2_val = ds.DraftDataset(split2_val, le)
-split3_train = load_data(data_folder + 'split3_train.pkl')
-split3_train = ds.DraftDataset(split3_train, le)
-split3_val = load_data(data_folder + 'split3_val.pkl')
-split3_val = ds.DraftDataset(split3_val, le)
+# Loads splits of training and validation data; split1 holds out the last third
+cv_splits = load_cv_data('cv_drafts', le)
+split1_train, split1_val = cv_splits[2]
+split2_train, split2_val = cv_splits[1]
+split3_train, split3_val = cv_splits[0]
 
 # Loads testing data
-drafts_tensor_train = load_data(data_folder + 'drafts_tensor_train.pkl')
-train_dataset = ds.DraftDataset(drafts_tensor_train, le)
-drafts_tensor_test = load_data(data_folder + 'drafts_tensor_test.pkl')
-test_dataset = ds.DraftDataset(drafts_tensor_test, le)
+train_dataset = load_data('drafts_tensor_train', le)
+test_dataset = load_data('drafts_tensor_test', le)
 
 ######
 # NNET UTILITY FUNCTIONS
@@ -224,6 +240,12 @@ def create_set_tensor(magic_set):
 # NNET TRAINING FUNCTIONS
 ######
 
+def to_device(x):
+    """Move a dense input tensor, or a tuple of sparse input tensors, to the GPU."""
+    if isinstance(x, tuple):
+        return tuple(t.cuda() for t in x)
+    return x.cuda()
+
 def train_net(net, dataloader, num_epoch, optimizer):
     """Train the network."""
     net.train()    
@@ -243,19 +265,18 @@ def train_net(net, dataloader, num_epoch, optimizer):
             
             # cuda() is needed for GPU mode, not sure why
             if device.type != "cpu":
-                x = x.cuda()
+                x = to_device(x)
                 y = y.cuda() # Feature vector
             
             # Zero parameter gradients between batches
             optimizer.zero_grad()
         
-            # Perform training
+            # Perform training, y holds class indices
             y_pred = net(x)
-            y_integer = torch.argmax(y, 1) # Class indices
             
             # Use cross entropy loss 
             loss = torch.nn.CrossEntropyLoss()
-            output = loss(y_pred, y_integer)
+            output = loss(y_pred, y)
             output.backward()
             optimizer.step()
                         
@@ -280,17 +301,16 @@ def val_net(net, dataloader):
             
             # cuda() is needed for GPU mode, not sure why
             if device.type != "cpu":
-                x = x.cuda()
+                x = to_device(x)
                 y = y.cuda()
-            y_integer = torch.argmax(y, 1) # Class indices
             
             # Compute val loss
             y_pred = net(x)
             y_pred_integer = torch.argmax(y_pred, 1)
             
             # Compute accuracy
-            correct += int(sum(y_pred_integer == y_integer))
-            total += len(y_integer)
+            correct += int(sum(y_pred_integer == y))
+            total += len(y)
             
     accuracy = correct / total
     print("Validation accuracy:", accuracy, " Total picks:", int(total))
@@ -306,22 +326,23 @@ if device.type != "cpu":
     st = st.cuda()
 
 # Define dataloaders for complete datasets
-trainloader = torch.utils.data.DataLoader(train_dataset, batch_size=100, shuffle=True)
-testloader = torch.utils.data.DataLoader(test_dataset, batch_size=100, shuffle=False)
+trainloader = ds.create_batch_loader(train_dataset, batch_size=100, shuffle=True, sparse=sparse_input)
+testloader = ds.create_batch_loader(test_dataset, batch_size=100, shuffle=False, sparse=sparse_input)
 
 # Define dataloaders for cross-validation splits
-split1_train_loader = torch.utils.data.DataLoader(split1_train, batch_size=100, shuffle=True)
-split1_val_loader = torch.utils.data.DataLoader(split1_val, batch_size=100, shuffle=False)
-split2_train_loader = torch.utils.data.DataLoader(split2_train, batch_size=100, shuffle=True)
-split2_val_loader = torch.utils.data.DataLoader(split2_val, batch_size=100, shuffle=False)
-split3_train_loader = torch.utils.data.DataLoader(split3_train, batch_size=100, shuffle=True)
-split3_val_loader = torch.utils.data.DataLoader(split3_val, batch_size=100, shuffle=False)
+split1_train_loader = ds.create_batch_loader(split1_train, batch_size=100, shuffle=True, sparse=sparse_input)
+split1_val_loader = ds.create_batch_loader(split1_val, batch_size=100, shuffle=False, sparse=sparse_input)
+split2_train_loader = ds.create_batch_loader(split2_train, batch_size=100, shuffle=True, sparse=sparse_input)
+split2_val_loader = ds.create_batch_loader(split2_val, batch_size=100, shuffle=False, sparse=sparse_input)
+split3_train_loader = ds.create_batch_loader(split3_train, batch_size=100, shuffle=True, sparse=sparse_input)
+split3_val_loader = ds.create_batch_loader(split3_val, batch_size=100, shuffle=False, sparse=sparse_input)
 
 # Creates networks
-split1_net = DraftNet(st, use_features = use_features)
-split2_net = DraftNet(st, use_features = use_features)
-split3_net = DraftNet(st, use_features = use_features)
-final_net = DraftNet(st, use_features = use_features)
+net_class = ds.SparseDraftNet if sparse_input else DraftNet
+split1_net = net_class(st, use_features = use_features)
+split2_net = net_class(st, use_features = use_features)
+split3_net = net_class(st, use_features = use_features)
+final_net = net_class(st, use_features = use_features)
 if device.type != "cpu":
     split1_net = split1_net.cuda()
     split2_net = split2_net.cuda()
@@ -0,0 +1,44 @@
+# BayesBot count updates
+# Folds new drafts into the co-draft and choice counts read by BayesBot, see draftsimtools.bayes
+#
+# Examples:
+#   python update_bayes_counts.py update bots_data/bayes_counts.npz drafts_store
+#   python update_bayes_counts.py update part0.npz drafts.csv --ratings m19_rating.tsv m19_land_rating.tsv --stop 100000
+#   python update_bayes_counts.py merge bots_data/bayes_counts.npz part0.npz part1.npz
+
+import argparse
+
+import draftsimtools as ds
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep BayesBot co-draft and choice counts up to date.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    update = commands.add_parser("update", help="Count drafts of a source that are not counted yet.")
+    update.add_argument("counts", help="Counts .npz file, created if missing.")
+    update.add_argument("source", help="Draft store (path without extension) or draft csv file.")
+    update.add_argument("--ratings", nargs="+", metavar="RATING_PATH",
+                        help="Set rating file(s), see create_set. Needed for new counts from a csv file.")
+    update.add_argument("--start", type=int, default=0, help="First draft to count.")
+    update.add_argument("--stop", type=int, default=None, help="End of the drafts to count.")
+    update.add_argument("--n-jobs", type=int, default=1, help="Processes parsing a csv file.")
+
+    merge = commands.add_parser("merge", help="Sum counts of disjoint sets of drafts.")
+    merge.add_argument("counts", help="Merged counts .npz file.")
+    merge.add_argument("parts", nargs="+", help="Counts .npz files to sum.")
+
+    args = parser.parse_args(argv)
+    if args.command == "update":
+        le, set_var = None, None
+        if args.ratings:
+            set_var = ds.create_set(*args.ratings)
+            le = ds.create_le(ds.fix_set_names(set_var)["Name"].values)
+        counts, added = ds.update_cooccurrence(args.counts, args.source, le, set_var,
+                                               args.start, args.stop, n_jobs=args.n_jobs)
+        print("Added %d drafts to %s" % (added, args.counts))
+    else:
+        ds.merge_cooccurrence(args.counts, args.parts)
+        print("Merged %d files into %s" % (len(args.parts), args.counts))
+
+if __name__ == "__main__":
+    main()